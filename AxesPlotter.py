@@ -1,71 +1,335 @@
 from enum import Enum, auto
-from typing import Tuple
+from typing import Dict, List, Optional, Set, Tuple, Union, TYPE_CHECKING
 
+import matplotlib.dates as mdates
+import numpy as np
+import pandas as pd
 from matplotlib.axes import Axes
+from matplotlib.collections import LineCollection
+from matplotlib.lines import Line2D
 from matplotlib.ticker import ScalarFormatter
 
-from DataAccessObject import DataAccessObject
-from Enums import PatientCase, PatientCategory, DataForm
+import Instrumentation
+from Enums import Country, PatientCase, PatientCategory, DataForm
+
+if TYPE_CHECKING:
+    from DataAccessObject import DataAccessObject
+    from Transform import Pipeline
+
+ArtistKey = Tuple[Country, PatientCase, PatientCategory, str]
+
+# label of the series collapsed in one artist (see AxesPlotter top_n).
+other_label = 'Other'
+
+
+class PlottedSeries:
+    """
+    Data of one line of the plot, the cumulative sum being computed only once (when asked).
+    """
+
+    def __init__(self, x: pd.Index, y: np.ndarray, is_already_cum: bool, y_cum: Optional[np.ndarray] = None,
+                 x_num: Optional[np.ndarray] = None):
+        """
+
+        :param x: the dates.
+        :param y: the values.
+        :param is_already_cum: True if the values do not need a cumulative sum.
+        :param y_cum: the cumulative sum of the values, when already known [default = None : computed when asked].
+        :param x_num: the dates as numbers (see get_x_num), shared by the series of the same plot [default = None :
+        computed from x].
+        """
+        self.x = x
+        self.y = y
+        self.is_already_cum = is_already_cum
+        self._y_cum = y_cum
+
+        # x as numbers (for the level of detail).
+        self.x_num: np.ndarray = x_num if x_num is not None else PlottedSeries.get_x_num(x)
+
+    @staticmethod
+    def get_x_num(x: pd.Index) -> np.ndarray:
+        """
+        :return: the dates as the numbers of matplotlib (see matplotlib.dates).
+        """
+        return mdates.date2num(x.to_pydatetime()) if isinstance(x, pd.DatetimeIndex) else np.asarray(x, dtype=float)
+
+    def get_y(self, cumsum: bool) -> np.ndarray:
+        if not cumsum or self.is_already_cum:
+            return self.y
+        if self._y_cum is None:
+            self._y_cum = pd.Series(self.y).cumsum().to_numpy()
+        return self._y_cum
+
+    def get_decimated(self, cumsum: bool, x_range: Optional[Tuple[float, float]], n_pixels: int) -> \
+            Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Points needed to draw the series on n_pixels columns : for each column, the first, the min, the max and the
+        last point are kept (the shape of the curve is the same as with all the points).
+        :param cumsum: Day by day or cumulative sum.
+        :param x_range: the visible range of x (None : the whole series).
+        :param n_pixels: the width of the visible range in pixels.
+        :return: x (numbers), y and the number of points in the visible range.
+        """
+        y = self.get_y(cumsum)
+        x = self.x_num
+
+        # visible points (+ one on each side so that the line goes to the border).
+        if x_range is not None:
+            start = max(int(np.searchsorted(x, x_range[0], side='left')) - 1, 0)
+            stop = min(int(np.searchsorted(x, x_range[1], side='right')) + 1, len(x))
+            x, y = x[start:stop], y[start:stop]
+        n_visible = len(x)
+
+        if n_visible <= 4 * n_pixels:
+            return x, y, n_visible
+
+        valid = ~np.isnan(y)
+        if not valid.any():
+            # nothing to draw (e.g. the series is not known any more at the end).
+            return x[:0], y[:0], n_visible
+        x, y = x[valid], y[valid]
+        x_min, x_max = x_range if x_range is not None else (x[0], x[-1])
+        scale = n_pixels / (x_max - x_min) if x_max > x_min else 0.
+        column = np.clip(((x - x_min) * scale).astype(int), 0, n_pixels - 1)
+
+        # columns are sorted (x is sorted) : first and last point of each column.
+        first = np.concatenate(([0], np.flatnonzero(np.diff(column)) + 1))
+        last = np.concatenate((first[1:] - 1, [len(x) - 1]))
+
+        # min and max of each column (points sorted by column, then by y).
+        order = np.lexsort((y, column))
+        keep = np.unique(np.concatenate((first, last, order[first], order[last])))
+
+        return x[keep], y[keep], n_visible
 
 
 class AxesPlotter:
     """
     This class allows to plot on an axes the data following the pattern of PlotPattern.
     It needs a data access object (which depends on the country) to access the data AND a plotPattern.
+
+    The lines are kept (see artists) : plotting the same data again only shows the line again and a change of
+    cumsum / log updates the lines in place (see update_style).
+
+    With level_of_detail, the lines only contain the points needed at the current zoom (see
+    PlottedSeries.get_decimated), and they are updated when the visible range changes. With top_n, only the top_n
+    series (biggest total) of a plot are drawn as lines, the other ones are drawn in one artist.
     """
 
-    def __init__(self, dao: DataAccessObject):
+    def __init__(self, dao: 'DataAccessObject', level_of_detail: bool = False, top_n: Optional[int] = None):
+        """
+
+        :param dao: the data access object.
+        :param level_of_detail: draw only the points visible at the current zoom [default = False].
+        :param top_n: maximum number of lines of one plot, the other series are collapsed in one artist
+        [default = None : no limit].
+        """
         self.dao = dao
+        self.level_of_detail = level_of_detail
+        self.top_n = top_n
+
+        # artists already created, (country, case, category, label) -> line (or collection for the other series).
+        self.artists: Dict[ArtistKey, Union[Line2D, LineCollection]] = dict()
+
+        # data of the artists.
+        self.series: Dict[ArtistKey, List[PlottedSeries]] = dict()
 
-    def plot(self, ax: Axes, plot_pattern: Tuple[PatientCase, PatientCategory], cumsum: bool = False, log: bool = False):
+        # current cumsum of each axis, and the axes already followed for the zoom.
+        self.dic_cumsum: Dict[Axes, bool] = dict()
+        self.set_followed_axes: Set[Axes] = set()
+
+    @Instrumentation.timed('plotter.plot')
+    def plot(self, ax: Axes, plot_pattern: Tuple[PatientCase, PatientCategory], cumsum: bool = False, log: bool = False,
+             pipeline: Optional['Pipeline'] = None):
         """
         Plot the data on the provided axis.
         :param ax: The axis you want to plot on.
         :param plot_pattern: A tuple with first arg as PatientCase and second PatientCategory (=None if no category)
         :param cumsum: Day by day or cumulative sum [default = False].
         :param log: If you want logy presentation [default = False].
+        :param pipeline: transforms of the data, e.g. 7-day mean per 100k inhabitants (see Transform)
+        [default = None : the data as they are].
         :return:
         """
 
-        # get data
-        data_ = self.dao.get_data(plot_pattern[0], plot_pattern[1])
-        if data_ is None:
+        # get data (all the values of the category at once, see DataAccessObject.get_transformed).
+        aggregate = self.dao.get_transformed(plot_pattern[0], plot_pattern[1], pipeline)
+        if aggregate is None:
             return
 
+        if self.level_of_detail and ax not in self.set_followed_axes:
+            ax.callbacks.connect('xlim_changed', self._update_level_of_detail)
+            self.set_followed_axes.add(ax)
+        self.dic_cumsum[ax] = cumsum
+
         # check type of data (state or change of state).
         data_form = plot_pattern[0].get_data_form
         is_already_cum = data_form != DataForm.daily_incidence
 
         # make title
         title = plot_pattern[0].get_clean_str
+        if pipeline is not None and len(pipeline) > 0:
+            title += ' (' + pipeline.get_clean_str + ')'
+
+        # the cumulative sums are computed once by the data access object (see DataAccessObject.derived_cases), then
+        # transformed by the same pipeline (on the dates of the data).
+        cumsum_case = self.dao.get_derived_case(plot_pattern[0], 'cumsum') if not is_already_cum else None
+        aggregate_cum = self.dao.get_transformed(cumsum_case, plot_pattern[1], pipeline) \
+            if cumsum_case is not None else None
+        if aggregate_cum is not None and not aggregate_cum.index.equals(aggregate.index):
+            aggregate_cum = aggregate_cum.reindex(aggregate.index)
+
+        # data are sorted by date (see DataAccessObject.get_aggregate).
+        values = aggregate.to_numpy()
+        values_cum = aggregate_cum.to_numpy() if aggregate_cum is not None else None
+        # the same dates for all the series : converted once.
+        x_num = PlottedSeries.get_x_num(aggregate.index)
+        dic_series = {label: PlottedSeries(aggregate.index, values[:, index], is_already_cum,
+                                           values_cum[:, index] if values_cum is not None else None, x_num)
+                      for index, label in enumerate(aggregate.columns)}
+
+        # the series after the top_n biggest ones are collapsed.
+        list_other: List[PlottedSeries] = list()
+        if self.top_n is not None and len(dic_series) > self.top_n:
+            ranking = sorted(dic_series.keys(), key=lambda label: np.nansum(dic_series[label].y), reverse=True)
+            list_other = [dic_series.pop(label) for label in ranking[self.top_n:]]
+
+        # lines of this pattern collapsed since the last plot are hidden.
+        for key, artist in self.artists.items():
+            if key[:3] == (self.dao.country, plot_pattern[0], plot_pattern[1]) and key[3] not in dic_series:
+                artist.set_visible(False)
 
         # loop to plot
-        for label, data in sorted(data_.items(), key=lambda x: x[0], reverse=True):
+        for label, series in sorted(dic_series.items(), key=lambda x: x[0], reverse=True):
 
-            # label = key
-            # data = data_[key]
+            key = (self.dao.country, plot_pattern[0], plot_pattern[1], label)
+            self.series[key] = [series]
 
             # when there is only one item (all the country, no category, we must just label the data as 'Country').
             label = self.dao.country.name.capitalize() if label == 'None' else label
             label = title + ' - ' + label
 
-            if cumsum and not is_already_cum:
-                data_to_plot = data[PatientCategory.total.name].cumsum().sort_index()
-            else:
-                data_to_plot = data[PatientCategory.total.name].sort_index()
+            line = self.artists.get(key)
+            if line is not None and line.axes is ax:
+                # already created : update data (may have been refreshed or transformed) and show it.
+                line.set_visible(True)
+                line.set_label(label)
+                self._set_artist_data(ax, key)
+                continue
 
             # daily needs points to
             line_style = '-o' if cumsum else '-o'
 
-            if log:
-                ax.semilogy(data.index, data_to_plot, line_style, label=label)
-                for axis in [ax.yaxis]:
-                    axis.set_major_formatter(ScalarFormatter())
+            self.artists[key], = ax.plot(series.x, series.get_y(cumsum), line_style, label=label)
+            self._set_artist_data(ax, key)
+
+        if list_other:
+            key = (self.dao.country, plot_pattern[0], plot_pattern[1], other_label)
+            self.series[key] = list_other
+
+            collection = self.artists.get(key)
+            label = title + ' - ' + other_label + ' (' + str(len(list_other)) + ')'
+            if collection is None or collection.axes is not ax:
+                collection = LineCollection([], colors='0.6', linewidths=0.8, label=label)
+                ax.add_collection(collection)
+                self.artists[key] = collection
+            collection.set_label(label)
+            collection.set_visible(True)
+            self._set_artist_data(ax, key)
+
+        self.update_style(ax, cumsum, log)
+
+    @Instrumentation.timed('plotter.update_style')
+    def update_style(self, ax: Axes, cumsum: bool = False, log: bool = False):
+        """
+        Change cumsum / log of the lines visible on the axis (the lines are updated in place).
+        :param ax: The axis.
+        :param cumsum: Day by day or cumulative sum [default = False].
+        :param log: If you want logy presentation [default = False].
+        :return:
+        """
+        self.dic_cumsum[ax] = cumsum
+        for key, artist in self.artists.items():
+            if artist.axes is ax and artist.get_visible():
+                self._set_artist_data(ax, key)
+
+        if log:
+            ax.set_yscale('log')
+            ax.yaxis.set_major_formatter(ScalarFormatter())
+        else:
+            ax.set_yscale('linear')
+
+        self._update_axes(ax)
+
+    def clear(self, ax: Axes):
+        """
+        Hide all the lines of the axis (they are kept to be shown again).
+        :param ax: The axis.
+        :return:
+        """
+        for artist in self.artists.values():
+            if artist.axes is ax:
+                artist.set_visible(False)
+
+        self._update_axes(ax)
+
+    def _set_artist_data(self, ax: Axes, key: ArtistKey):
+        """
+        Set the data of the artist for the current cumsum (and the current zoom with level_of_detail).
+        """
+        artist = self.artists[key]
+        cumsum = self.dic_cumsum.get(ax, False)
+
+        # the whole data are used as long as the limits follow the data (the limits stay right).
+        x_range = None if ax.get_autoscalex_on() else ax.get_xlim()
+        n_pixels = max(int(ax.bbox.width), 1)
+
+        list_xy = list()
+        n_visible = 0
+        for series in self.series[key]:
+            if self.level_of_detail:
+                x, y, n = series.get_decimated(cumsum, x_range, n_pixels)
             else:
-                ax.plot(data.index, data_to_plot, line_style, label=label)
+                x, y, n = series.x_num, series.get_y(cumsum), len(series.x_num)
+            list_xy.append((x, y))
+            n_visible = max(n_visible, n)
+
+        if isinstance(artist, LineCollection):
+            artist.set_segments([np.column_stack(xy) for xy in list_xy])
+            return
+
+        artist.set_data(*list_xy[0])
+
+        # the markers are only drawn when they are not too close to each other.
+        if self.level_of_detail:
+            artist.set_marker('o' if 4 * n_visible <= n_pixels else 'None')
+
+    def _update_level_of_detail(self, ax: Axes):
+        """
+        When the visible range of x changes (zoom, pan) : the lines are decimated again.
+        """
+        for key, artist in self.artists.items():
+            if artist.axes is ax and artist.get_visible():
+                self._set_artist_data(ax, key)
+
+    @staticmethod
+    def _update_axes(ax: Axes):
+        """
+        Limits and legend for the visible lines only.
+        """
+        visible_artists = [artist for artist in ax.get_lines() + ax.collections if artist.get_visible()]
+
+        ax.relim(visible_only=True)
+        for collection in ax.collections:
+            if collection.get_visible() and len(collection.get_segments()) > 0:
+                ax.update_datalim(np.concatenate(collection.get_segments()))
+        ax.autoscale_view()
 
         # legend
-        ax.legend()
+        if visible_artists:
+            ax.legend(handles=visible_artists)
+        elif ax.get_legend() is not None:
+            ax.get_legend().remove()
 
         # grid
-        ax.grid(which='both')
+        ax.grid(True, which='both')
@@ -1,89 +1,863 @@
-from typing import List, Dict, Optional
+import threading
+from concurrent.futures import Future
+from typing import Iterable, List, Dict, Optional, IO, Tuple, Union
+import numpy as np
 import pandas as pd
-import requests
 import io
 
+import Instrumentation
+from DataCache import CacheEntry, DataCache
 from DataSource import FileInformation, DataSource
+from Downloader import Downloader
 from Enums import Country, PatientCase, PatientCategory, DataForm
+from Transform import Pipeline
+
+
+class LineOffsetReader(io.RawIOBase):
+    """
+    Binary stream reading another stream and keeping the offset of each line (see DataAccessObject.refresh).
+    """
+
+    def __init__(self, stream: IO[bytes]):
+        super().__init__()
+        self.stream = stream
+
+        # number of bytes read, offsets of the '\n' and the beginning of the stream (up to the first '\n').
+        self.position = 0
+        self.list_newlines: List[np.ndarray] = list()
+        self.first_line = b''
+        self.first_line_complete = False
+
+    def readable(self) -> bool:
+        return True
+
+    def readinto(self, buffer) -> int:
+        data = self.stream.read(len(buffer))
+        size = len(data)
+        buffer[:size] = data
+
+        newlines = np.flatnonzero(np.frombuffer(data, dtype=np.uint8) == ord('\n'))
+        if not self.first_line_complete:
+            self.first_line += data[:newlines[0] if len(newlines) > 0 else size]
+            self.first_line_complete = len(newlines) > 0
+        self.list_newlines.append(newlines + self.position)
+        self.position += size
+        return size
+
+    def get_line_starts(self) -> np.ndarray:
+        """
+        :return: the offset of the beginning of each line.
+        """
+        starts = np.concatenate([[0]] + [newlines + 1 for newlines in self.list_newlines])
+        return starts[starts < self.position]
 
 
 class DataAccessObject:
     """
     This object allows to access the data through universal (Enums) categories and universal cases.
+    The files are only downloaded and parsed when the data of one of their cases are asked for (see load and
+    prefetch) : creating the object is instant, and each user only pays for the files it needs.
     """
 
-    def __init__(self, country: Country):
+    # type of the columns when the files are parsed (the other categories are stored as 'category').
+    dtype_category: Dict[PatientCategory, str] = {
+            PatientCategory.date: 'str',
+            PatientCategory.total: 'float64'
+    }
+
+    # the last days of a file can still be modified by the source : they are parsed again by refresh.
+    refresh_days: int = 7
+
+    # the cases which are not in the files of a country but can be computed from another case : case -> (base case,
+    # transform of the base case, 'cumsum' or 'diff'). See get_aggregate.
+    derived_cases: Dict[PatientCase, Tuple[PatientCase, str]] = {
+            PatientCase.positive_to_covid_cumsum: (PatientCase.positive_to_covid_daily, 'cumsum'),
+            PatientCase.death_cumsum: (PatientCase.death_daily, 'cumsum'),
+            PatientCase.test_number_cumsum: (PatientCase.test_number_daily, 'cumsum'),
+            PatientCase.positive_to_covid_daily: (PatientCase.positive_to_covid_cumsum, 'diff'),
+            PatientCase.death_daily: (PatientCase.death_cumsum, 'diff'),
+            PatientCase.test_number_daily: (PatientCase.test_number_cumsum, 'diff')
+    }
+
+    # the dates of the tables are stored as days since 1970-01-01 (int32, see _to_days), this one for a missing date
+    # (smaller than all the other ones).
+    missing_day: int = int(np.iinfo(np.int32).min)
+
+    def __init__(self, country: Country, list_file_info: Optional[List[FileInformation]] = None,
+                 downloader: Optional[Downloader] = None, use_cache: bool = True,
+                 cache: Optional[DataCache] = None):
+        """
+
+        :param country: the country.
+        :param list_file_info: the files to load [default = DataSource.get_info_for_country(country)]. Mostly
+        useful to point the object to other servers (e.g. a local copy of the files).
+        :param downloader: the downloader used to fetch the files [default = a new Downloader].
+        :param use_cache: keep a local copy of the files (see DataCache) [default = True].
+        :param cache: the cache used when use_cache is True [default = DataCache()].
+        """
         self.country = country
 
         # contains all the information to access data and mapping from field of the csv to enum fields (see Enums).
-        self.list_file_info: List[FileInformation] = DataSource.get_info_for_country(country)
+        self.list_file_info: List[FileInformation] = list_file_info if list_file_info is not None \
+            else DataSource.get_info_for_country(country)
 
-        # contains the data (in pandas DataFrame form).
-        self.data_dic: Dict[PatientCase, List[pd.DataFrame]] = dict()
+        # the same file can describe several cases (e.g. one column per case), group the information by file.
+        self.dic_file_info_by_url: Dict[str, List[FileInformation]] = dict()
+        for item in self.list_file_info:
+            self.dic_file_info_by_url.setdefault(item.http_file, list()).append(item)
 
-        # download data
+        # the files of each case.
+        self.dic_urls_by_case: Dict[PatientCase, List[str]] = dict()
         for item in self.list_file_info:
+            self.dic_urls_by_case.setdefault(item.case, list()).append(item.http_file)
+
+        # contains the data (in pandas DataFrame form) of the cases loaded.
+        self.data_dic: Dict[PatientCase, List[pd.DataFrame]] = dict()
 
-            # download content
-            data_raw = requests.get(item.http_file).content
+        # contains the aggregate (date x value of the category) already computed (see get_aggregate).
+        self.dic_aggregate: Dict[Tuple[PatientCase, PatientCategory], Optional[pd.DataFrame]] = dict()
 
-            # make a dic with pandas DataFrame
+        # the rollups already computed (see query) : (case, index of the table, categories) -> total for each day and
+        # each combination of the values of the categories.
+        self.dic_rollup: Dict[Tuple[PatientCase, int, Tuple[str, ...]], pd.Series] = dict()
+
+        # the transforms of the aggregates already computed (see get_transformed), (case, category, pipeline) ->
+        # transformed aggregate.
+        self.dic_transformed: Dict[Tuple[PatientCase, PatientCategory, Pipeline], Optional[pd.DataFrame]] = dict()
+
+        # local copy of the parsed files.
+        self.cache: Optional[DataCache] = (cache if cache is not None else DataCache()) if use_cache else None
+
+        # the parsed files loaded (and the information to refresh them), and the last date of each file.
+        self.dic_entry: Dict[str, Optional[CacheEntry]] = dict()
+        self.dic_last_date: Dict[str, pd.Timestamp] = dict()
+
+        # each file is loaded once, even when asked by several threads at the same time (see _load_once).
+        self.dic_file_lock: Dict[str, threading.Lock] = {url: threading.Lock() for url in self.dic_file_info_by_url}
+
+        self.downloader = downloader if downloader is not None else Downloader()
+
+    def load(self, cases: Optional[Iterable[PatientCase]] = None):
+        """
+        Download and parse the files of the cases which are not loaded yet (all the files at the same time).
+        Called when the data of a case are asked for : calling it first is only needed to pay for the download at
+        a chosen time (see also prefetch).
+        :param cases: the cases [default = None : all the cases].
+        :return:
+        """
+        cases = list(dict.fromkeys(self._get_base_case(case) for case in cases)) if cases is not None \
+            else list(self.dic_urls_by_case.keys())
+        if all(case in self.data_dic for case in cases):
+            return
+
+        urls = [url for case in cases for url in self.dic_urls_by_case.get(case, list())]
+        with Instrumentation.span('dao.load', country=self.country.name):
+            self.downloader.map(self._load_once, urls)
+            self._set_data(cases)
+
+    def prefetch(self, cases: Optional[Iterable[PatientCase]] = None) -> Future:
+        """
+        Load the files of the cases in a background thread (see load), e.g. while the user chooses what to plot.
+        :param cases: the cases [default = None : all the cases].
+        :return: the future of the loading (its exception if the files could not be downloaded).
+        """
+        cases = list(cases) if cases is not None else None
+        future: Future = Future()
+
+        def run():
             try:
-                # if this does not work you can try 'utf-8'
-                temp_data: pd.DataFrame = pd.read_csv(io.StringIO(data_raw.decode('latin_1')),
-                                                      sep=country.sep)
-            except UnicodeDecodeError:
-                print('Format is not the right one.')
+                self.load(cases)
+            except Exception as error:
+                future.set_exception(error)
+            else:
+                future.set_result(None)
+
+        # a daemon thread : the program does not wait for it to exit.
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def is_loaded(self, case: PatientCase) -> bool:
+        """
+        :param case:
+        :return: True if the files of the case are loaded (the data are available without any download).
+        """
+        return all(url in self.dic_entry for url in self.dic_urls_by_case.get(self._get_base_case(case), list()))
+
+    def _get_derivation(self, case: PatientCase) -> Optional[Tuple[PatientCase, str]]:
+        """
+        :param case:
+        :return: None (the case is in the files, or not available) or the base case and the transform (see
+        derived_cases).
+        """
+        derivation = DataAccessObject.derived_cases.get(case)
+        if case in self.dic_urls_by_case or derivation is None or derivation[0] not in self.dic_urls_by_case:
+            return None
+        return derivation
+
+    def _get_base_case(self, case: PatientCase) -> PatientCase:
+        """
+        :return: the case of the files used for the case.
+        """
+        derivation = self._get_derivation(case)
+        return derivation[0] if derivation is not None else case
+
+    def get_derived_case(self, case: PatientCase, transform: str) -> Optional[PatientCase]:
+        """
+        :param case:
+        :param transform: 'cumsum' or 'diff'.
+        :return: the case computed from this one with the transform (None : not available).
+        """
+        for derived_case, derivation in DataAccessObject.derived_cases.items():
+            if derivation == (case, transform) and self._get_derivation(derived_case) is not None:
+                return derived_case
+        return None
+
+    @staticmethod
+    def _derive(data: pd.DataFrame, transform: str) -> pd.DataFrame:
+        """
+        :param data: the totals of the base case (dates x values of a category).
+        :param transform: 'cumsum' or 'diff'.
+        :return: the totals of the derived case.
+        """
+        if transform == 'cumsum':
+            # the missing values stay missing (the sum goes on after them).
+            return data.cumsum()
+
+        # the first day : the whole total.
+        derived = data.diff()
+        derived.iloc[:1] = data.iloc[:1]
+        return derived
+
+    def _load_once(self, url: str):
+        """
+        Load the file if it is not loaded yet. The other threads asking for the same file wait for it.
+        :param url: the http link to the file.
+        :return:
+        """
+        if url in self.dic_entry:
+            return
+        with self.dic_file_lock[url]:
+            if url not in self.dic_entry:
+                self._set_entry(url, self._load_file(url))
+
+    def _set_entry(self, url: str, entry: Optional[CacheEntry]):
+        if entry is not None:
+            header = self.dic_file_info_by_url[url][0].dic_category[PatientCategory.date]
+            last_day = entry.table[header].max()
+            if last_day != DataAccessObject.missing_day:
+                self.dic_last_date[url] = self._to_date(last_day)
+
+        # last : the file is loaded for the other threads (see _load_once).
+        self.dic_entry[url] = entry
+
+    def _set_data(self, cases: Iterable[PatientCase]):
+        """
+        Split the parsed files by case (with the universal headers).
+        :param cases: the cases to update (their files must be loaded).
+        :return:
+        """
+        for case in cases:
+            list_data = list()
+            for item in self.list_file_info:
+                entry = self.dic_entry.get(item.http_file)
+                if item.case != case or entry is None:
+                    continue
+
+                # the columns of the entry (a selection by a list of headers would copy all of them).
+                list_data.append(pd.DataFrame({univ_header.name: entry.table[header]
+                                               for univ_header, header in item.dic_category.items()}, copy=False))
+
+            # the dataFrames of the case (no entry if none of its files could be parsed).
+            if list_data:
+                self.data_dic[case] = list_data
+            else:
+                self.data_dic.pop(case, None)
+
+    def _load_file(self, url: str) -> Optional[CacheEntry]:
+        """
+        Load one file (shared by all the FileInformation pointing to it), from the cache when it is still valid.
+        :param url: the http link to the file.
+        :return: None (file could not be parsed) or the entry with the whole table (raw headers).
+        """
+        with Instrumentation.span('dao.cache_load', url=url):
+            entry = self.cache.load(url) if self.cache is not None else None
+        if entry is not None and self.cache.is_fresh(entry):
+            return entry
+
+        return self._download_file(url, entry)[0]
+
+    def _download_file(self, url: str, entry: Optional[CacheEntry], use_tail: bool = True) -> \
+            Tuple[Optional[CacheEntry], bool, Optional[pd.Timestamp]]:
+        """
+        Download the file if it changed since the entry was stored. When the entry knows where the last days of the
+        file begin (see _get_tail), only the end of the file is asked (Range request) and parsed.
+        :param url: the http link to the file.
+        :param entry: the current entry (None : not loaded yet).
+        :param use_tail: only ask for the end of the file when possible [default = True].
+        :return: the entry (the same one if the file has not changed), True if the file changed and the first date
+        which may have changed (None : any date).
+        """
+        # only needed when something is downloaded.
+        import requests
+        import urllib3
+
+        tail = entry.meta.get('tail') if entry is not None and use_tail else None
+        headers = entry.get_validation_headers() if entry is not None else dict()
+        if tail is not None:
+            # from the end of the previous row (offsets in the decoded content).
+            headers.update({'Range': 'bytes=' + str(tail['offset'] - 1) + '-', 'Accept-Encoding': 'identity'})
+
+        # download content (only if it changed since it has been cached)
+        try:
+            with Instrumentation.span('dao.request', url=url):
+                response = self.downloader.fetch(url, headers=headers, stream=True)
+        except requests.RequestException as error:
+            # the file is shorter than before : it must be downloaded again.
+            if tail is not None and getattr(error.response, 'status_code', None) == 416:
+                return self._download_file(url, entry, use_tail=False)
+            if entry is None:
+                raise
+            print('Server not available, cached data are used for ' + url)
+            return entry, False, None
+
+        try:
+            with response:
+                if entry is not None and response.status_code == 304:
+                    if self.cache is not None:
+                        self.cache.touch(entry)
+                    return entry, False, None
+
+                if tail is not None:
+                    # the server sends the whole file : the beginning (already parsed) is skipped.
+                    if response.status_code != 206:
+                        remaining = tail['offset'] - 1
+                        while remaining > 0:
+                            data = response.raw.read(min(remaining, 1024 ** 2))
+                            if not data:
+                                break
+                            remaining -= len(data)
+                            Instrumentation.count('bytes_downloaded', len(data))
+
+                    # the row tail['row'] must still begin at the same offset.
+                    table = None
+                    if response.raw.read(1) == b'\n':
+                        table, new_tail, since = self._parse_tail(url, entry, response.raw)
+                    if table is None:
+                        return self._download_file(url, entry, use_tail=False)
+                else:
+                    reader = LineOffsetReader(response.raw)
+                    table = self._parse(url, io.BufferedReader(reader))
+                    Instrumentation.count('bytes_downloaded', reader.position)
+                    since = None
+                    new_tail = None
+                    if table is not None:
+                        names = self._get_names(reader.first_line)
+                        new_tail = self._get_tail(url, table, 0, reader.get_line_starts()[1:], names)
+        except (requests.RequestException, urllib3.exceptions.HTTPError):
+            # the connection was lost while the content was read (it is read as it is parsed).
+            if entry is None:
+                raise
+            print('Download interrupted, cached data are used for ' + url)
+            return entry, False, None
+
+        # the data already loaded are kept.
+        if table is None:
+            return entry, False, None
+
+        etag, last_modified = response.headers.get('ETag'), response.headers.get('Last-Modified')
+        if self.cache is not None:
+            return self.cache.store(url, table, etag, last_modified, new_tail), True, since
+        return CacheEntry(url, table, {'etag': etag, 'last_modified': last_modified, 'tail': new_tail}), True, since
+
+    def _parse_tail(self, url: str, entry: CacheEntry, stream: IO[bytes]) -> \
+            Tuple[Optional[pd.DataFrame], Optional[Dict], Optional[pd.Timestamp]]:
+        """
+        Parse the end of the file (from the row tail['row'] of the entry) and append it to the table of the entry.
+        The first row parsed must be the same as the one of the entry (else the beginning of the file has changed).
+        :param url: the http link to the file.
+        :param entry: the current entry.
+        :param stream: the end of the file.
+        :return: the new table (None if the file must be parsed again from the beginning), the new tail and the first
+        date parsed.
+        """
+        tail = entry.meta['tail']
+
+        reader = LineOffsetReader(stream)
+        try:
+            tail_table = self._parse(url, io.BufferedReader(reader), tail['names'])
+        except ValueError:
+            # the offset is not the beginning of a row anymore.
+            tail_table = None
+        Instrumentation.count('bytes_downloaded', reader.position)
+        if tail_table is None or len(tail_table) == 0 or \
+                not self._is_same_row(tail_table.iloc[0], entry.table.iloc[tail['row']]):
+            return None, None, None
+
+        table = self._concat_tables(entry.table.iloc[:tail['row']], tail_table)
+        new_tail = self._get_tail(url, table, tail['row'], tail['offset'] + reader.get_line_starts(), tail['names'])
+
+        header = self.dic_file_info_by_url[url][0].dic_category[PatientCategory.date]
+        days = tail_table[header].to_numpy()
+        days = days[days != DataAccessObject.missing_day]
+        return table, new_tail, self._to_date(days.min()) if len(days) > 0 else None
+
+    def _parse(self, url: str, stream: IO[bytes], names: Optional[List[str]] = None) -> Optional[pd.DataFrame]:
+        """
+        Parse one file as it is downloaded. Only the columns used by the FileInformation are kept.
+        :param url: the http link to the file.
+        :param stream: the raw content of the file.
+        :param names: the headers of the file, when the stream does not begin with them (see _parse_tail).
+        :return: None (file could not be parsed) or the table with the raw headers.
+        """
+        list_file_info = self.dic_file_info_by_url[url]
+
+        # type of each column used (the others are skipped by the parser).
+        dic_dtype: Dict[str, str] = dict()
+        for item in list_file_info:
+            for category, header in item.dic_category.items():
+                dic_dtype[header] = DataAccessObject.dtype_category.get(category, 'category')
+        na_values = [value for item in list_file_info for value in item.na_values]
+
+        # make a pandas DataFrame
+        try:
+            # the content is decoded as it is read (the parser ignores 'encoding' for the categorical columns), the
+            # time of the download is then part of this stage.
+            with Instrumentation.span('dao.read_csv', url=url):
+                table: pd.DataFrame = pd.read_csv(io.TextIOWrapper(stream, encoding=self.country.encoding),
+                                                  sep=self.country.sep, usecols=list(dic_dtype.keys()),
+                                                  dtype=dic_dtype, na_values=na_values,
+                                                  header=0 if names is None else None, names=names)
+        except UnicodeDecodeError:
+            print('Format is not the right one.')
+            return None
+        Instrumentation.count('rows_parsed', len(table))
+
+        # compact columns (see DataCache) : the dates as days, the counts as int32.
+        with Instrumentation.span('dao.to_datetime', url=url):
+            for header in {item.dic_category[PatientCategory.date] for item in list_file_info}:
+                table[header] = self._to_days(pd.to_datetime(table[header], format=self.country.date_format))
+        for header in {item.dic_category[PatientCategory.total] for item in list_file_info}:
+            table[header] = self._to_counts(table[header].to_numpy())
+
+        return table
+
+    @staticmethod
+    def _to_days(dates: pd.Series) -> np.ndarray:
+        """
+        :param dates: the dates (NaT if missing).
+        :return: the number of days since 1970-01-01 (int32, missing_day if missing).
+        """
+        values = dates.to_numpy(dtype='datetime64[D]')
+        days = values.astype(np.int64)
+        days[np.isnat(values)] = DataAccessObject.missing_day
+        return days.astype(np.int32)
+
+    @staticmethod
+    def _to_day(date) -> int:
+        """
+        :param date: a date (anything pd.Timestamp accepts).
+        :return: the number of days since 1970-01-01.
+        """
+        return int(DataAccessObject._to_days(pd.Series([pd.Timestamp(date)]))[0])
+
+    @staticmethod
+    def _to_date(day: int) -> pd.Timestamp:
+        return pd.Timestamp(np.datetime64(int(day), 'D'))
+
+    @staticmethod
+    def _to_date_index(days: np.ndarray) -> pd.DatetimeIndex:
+        return pd.DatetimeIndex(days.astype('datetime64[D]').astype('datetime64[ns]'), name=PatientCategory.date.name)
+
+    @staticmethod
+    def _to_counts(values: np.ndarray) -> Union[pd.arrays.IntegerArray, np.ndarray]:
+        """
+        :param values: the values parsed (NaN if missing).
+        :return: the values as nullable int32 (the values unchanged if they are not all integers).
+        """
+        missing = np.isnan(values)
+        known = values[~missing]
+        if not np.all((known == np.round(known)) & (np.abs(known) <= np.iinfo(np.int32).max)):
+            return values
+        return pd.arrays.IntegerArray(np.where(missing, 0, values).astype(np.int32), missing)
+
+    def _get_names(self, first_line: bytes) -> List[str]:
+        """
+        :param first_line: the first line of a file.
+        :return: the headers of the file.
+        """
+        line = first_line.decode(self.country.encoding).rstrip('\r')
+        return pd.read_csv(io.StringIO(line), sep=self.country.sep, nrows=0).columns.tolist()
+
+    def _get_tail(self, url: str, table: pd.DataFrame, first_row: int, row_starts: np.ndarray,
+                  names: List[str]) -> Optional[Dict]:
+        """
+        Where the next refresh of the file begins : at the last row before the last refresh_days days (all the rows
+        after it being more recent).
+        :param url: the http link to the file.
+        :param table: the parsed file.
+        :param first_row: the first row of the table for which the offset is known.
+        :param row_starts: the offset of the rows first_row, first_row + 1, ... in the file.
+        :param names: the headers of the file.
+        :return: None (the file will be parsed from the beginning) or the row, its offset and the headers.
+        """
+        # each row must be one line (no empty line, no line break in a value).
+        if len(row_starts) != len(table) - first_row or len(table) == first_row:
+            return None
+
+        header = self.dic_file_info_by_url[url][0].dic_category[PatientCategory.date]
+        days = table[header].to_numpy()[first_row:]
+        known = days != DataAccessObject.missing_day
+        if not known.any():
+            return None
+        limit = days[known].max() - self.refresh_days
+
+        old_rows = np.flatnonzero(known & (days < limit))
+        row = int(old_rows[-1]) if len(old_rows) > 0 else 0
+        return {'row': first_row + row, 'offset': int(row_starts[row]), 'names': names}
+
+    @staticmethod
+    def _is_same_row(row_1: pd.Series, row_2: pd.Series) -> bool:
+        return all(pd.isna(value_2) if pd.isna(value_1) else not pd.isna(value_2) and value_1 == value_2
+                   for value_1, value_2 in zip(row_1, row_2))
+
+    @staticmethod
+    def _concat_tables(table_1: pd.DataFrame, table_2: pd.DataFrame) -> pd.DataFrame:
+        """
+        Append the rows of table_2 to table_1 (the categorical columns stay categorical).
+        """
+        data = dict()
+        for name in table_1.columns:
+            if isinstance(table_1[name].dtype, pd.CategoricalDtype):
+                data[name] = pd.api.types.union_categoricals([table_1[name], table_2[name]])
             else:
-                temp_data = temp_data[[header for header in item.dic_category.values()]]
-                temp_data.columns = [univ_header.name for univ_header in item.dic_category.keys()]
+                data[name] = pd.concat((table_1[name], table_2[name]), ignore_index=True)
+        return pd.DataFrame(data, columns=table_1.columns)
+
+    @Instrumentation.timed('dao.refresh')
+    def refresh(self) -> Dict[PatientCase, Optional[pd.Timestamp]]:
+        """
+        Download and parse only what changed since the files were loaded : the server is asked for the end of
+        each file only (the last refresh_days days and the new days). If the beginning of a file changed, the
+        whole file is parsed again. The aggregates already computed are updated from the first date changed.
+        Only the files already loaded are refreshed (the other ones will be up to date when loaded).
+        :return: for each case which changed, the first date which may have changed (None : any date).
+        """
+        dic_result = self.downloader.map(lambda url: self._download_file(url, self.dic_entry[url]),
+                                         list(self.dic_entry.keys()))
+
+        dic_since: Dict[PatientCase, Optional[pd.Timestamp]] = dict()
+        for url, (entry, changed, since) in dic_result.items():
+            if not changed:
+                continue
+            self._set_entry(url, entry)
+            for item in self.dic_file_info_by_url[url]:
+                previous = dic_since.get(item.case, since)
+                dic_since[item.case] = None if previous is None or since is None else min(previous, since)
+
+        if len(dic_since) == 0:
+            return dic_since
+
+        self._set_data(dic_since.keys())
+
+        # only the days from since are computed again.
+        for key, aggregate in list(self.dic_aggregate.items()):
+            if key[0] not in dic_since:
+                continue
+            since = dic_since[key[0]]
+            if aggregate is None or since is None:
+                del self.dic_aggregate[key]
+                continue
+            with Instrumentation.span('dao.aggregate', case=key[0].name, category=key[1].name):
+                recent = self._compute_aggregate(key[0], key[1], since)
+            self.dic_aggregate[key] = pd.concat((aggregate[aggregate.index < since], recent)) \
+                if recent is not None else None
+
+        # the derived cases change with their base case : their aggregates are computed again when asked for.
+        for case in DataAccessObject.derived_cases:
+            base_case = self._get_base_case(case)
+            if base_case != case and base_case in dic_since:
+                dic_since[case] = dic_since[base_case]
+                for key in [key for key in self.dic_aggregate if key[0] == case]:
+                    del self.dic_aggregate[key]
+
+        # the transforms (rolling windows, ...) are computed again when asked for.
+        for key in [key for key in self.dic_transformed if key[0] in dic_since]:
+            del self.dic_transformed[key]
 
-                # set date as date format.
-                temp_data[PatientCategory.date.name] = pd.to_datetime(temp_data[PatientCategory.date.name])
+        # same for the rollups.
+        for key, rollup in list(self.dic_rollup.items()):
+            if key[0] not in dic_since:
+                continue
+            since = dic_since[key[0]]
+            if since is None or key[1] >= len(self.data_dic.get(key[0], list())):
+                del self.dic_rollup[key]
+                continue
+            first_day = self._to_day(since)
+            recent = self._compute_rollup(self.data_dic[key[0]][key[1]], key[2], first_day)
+            self.dic_rollup[key] = pd.concat((rollup.iloc[:self._get_day_position(rollup, first_day)], recent))
 
-                # add the dataFrame to the list for the current case.
-                if item.case not in self.data_dic.keys():
-                    self.data_dic[item.case] = list()
-                self.data_dic[item.case].append(temp_data)
+        return dic_since
 
-    def get_data(self, case: PatientCase, category: PatientCategory = None) -> Optional[Dict[str, pd.DataFrame]]:
+    def get_last_date(self, case: PatientCase) -> Optional[pd.Timestamp]:
+        """
+        :param case:
+        :return: the last date of the data of the case (None if not available).
+        """
+        case = self._get_base_case(case)
+        self.load([case])
+        list_dates = [self.dic_last_date[item.http_file] for item in self.list_file_info
+                      if item.case == case and item.http_file in self.dic_last_date]
+        return max(list_dates) if list_dates else None
+
+    @Instrumentation.timed('dao.get_data')
+    def get_data(self, case: PatientCase, category: PatientCategory = None,
+                 since: Optional[pd.Timestamp] = None) -> Optional[Dict[str, pd.DataFrame]]:
         """
         Return the data available for the (case, category).
+        The DataFrames are views on the aggregate (see get_aggregate) : they must not be modified in place.
         :param case:
         :param category:
+        :param since: only the dates from since (e.g. the first date changed by refresh) [default = None : all].
         :return: None (data not available) or the data (pd.DataFrame).
         """
+        aggregate = self.get_aggregate(case, category)
+        if aggregate is None:
+            return None
+        if since is not None:
+            aggregate = aggregate.iloc[aggregate.index.searchsorted(since):]
 
-        asked_for_country: bool = category is None or category == PatientCategory.country
+        # one column of the aggregate for each value of the category (no copy of the data).
+        values = aggregate.to_numpy()
+        return {label: pd.DataFrame(values[:, index:index + 1], index=aggregate.index,
+                                    columns=[PatientCategory.total.name], copy=False)
+                for index, label in enumerate(aggregate.columns)}
 
-        # find the table (index) in which we can find the category asked (country is an exception)
-        if not asked_for_country:
-            index = -1
-            for ind, table in enumerate(self.data_dic[case]):
-                if category.name in table.columns:
-                    index = ind
-                    break
+    def get_aggregate(self, case: PatientCase, category: PatientCategory = None) -> Optional[pd.DataFrame]:
+        """
+        Return the total for each date (index) and each value of the category (columns).
+        The table is computed once for each (case, category), then it is kept in memory.
+        :param case:
+        :param category:
+        :return: None (data not available) or the aggregate (pd.DataFrame). When asked for the country, the only
+        column is 'None'.
+        """
+        if category is None:
+            category = PatientCategory.country
 
-            if index == -1:
-                return None
-            current_table = self.data_dic[case][index]
-        else:
-            current_table = self.data_dic[case][0]
+        key = (case, category)
+        if key not in self.dic_aggregate:
+            derivation = self._get_derivation(case)
+            if derivation is not None:
+                # computed once from the aggregate of the base case (see derived_cases).
+                base = self.get_aggregate(derivation[0], category)
+                self.dic_aggregate[key] = self._derive(base, derivation[1]) if base is not None else None
+            else:
+                with Instrumentation.span('dao.aggregate', case=case.name, category=category.name):
+                    self.dic_aggregate[key] = self._compute_aggregate(case, category)
+
+        return self.dic_aggregate[key]
+
+    def get_transformed(self, case: PatientCase, category: PatientCategory = None,
+                        pipeline: Optional[Pipeline] = None) -> Optional[pd.DataFrame]:
+        """
+        Return the aggregate (see get_aggregate) transformed by the pipeline, for all the values of the category at
+        once (e.g. the 7-day mean per 100k inhabitants of all the municipalities).
+        The result is computed once for each (case, category, pipeline), then it is kept in memory (the pipelines with
+        the same steps share their result).
+        :param case:
+        :param category:
+        :param pipeline: the transforms [default = None : the aggregate].
+        :return: None (data not available) or the transformed aggregate (pd.DataFrame).
+        """
+        if category is None:
+            category = PatientCategory.country
+        if pipeline is None or len(pipeline) == 0:
+            return self.get_aggregate(case, category)
+
+        key = (case, category, pipeline)
+        if key not in self.dic_transformed:
+            aggregate = self.get_aggregate(case, category)
+            with Instrumentation.span('dao.transform', case=case.name, category=category.name,
+                                      pipeline=pipeline.get_clean_str):
+                self.dic_transformed[key] = pipeline.apply(aggregate, self.country) if aggregate is not None \
+                    else None
+
+        return self.dic_transformed[key]
+
+    def _compute_aggregate(self, case: PatientCase, category: PatientCategory,
+                           since: Optional[pd.Timestamp] = None) -> Optional[pd.DataFrame]:
+
+        asked_for_country: bool = category == PatientCategory.country
+
+        # find the table in which we can find the category asked (country is an exception)
+        index = self._find_table(case, [] if asked_for_country else [category.name])
+        if index is None:
+            return None
+        current_table = self.data_dic[case][index]
 
+        # the rows without date are dropped (missing_day is smaller than all the days).
+        first_day = self._to_day(since) if since is not None else DataAccessObject.missing_day + 1
+        current_table = current_table[current_table[PatientCategory.date.name].to_numpy() >= first_day]
+
+        # one groupby for all the values of the category (missing values of the category are dropped).
         if asked_for_country:
-            return {'None': current_table.groupby(by=[PatientCategory.date.name]).sum()}
+            aggregate = current_table.groupby(by=PatientCategory.date.name)[PatientCategory.total.name].sum() \
+                .to_frame('None')
+        else:
+            aggregate = current_table.groupby(by=[PatientCategory.date.name, category.name], observed=True)[
+                PatientCategory.total.name].sum().unstack(category.name)
+            aggregate.columns = aggregate.columns.tolist()
+
+        # days -> dates, the totals as float (NaN when a value of the category has no data for a date).
+        aggregate = aggregate.sort_index().astype('float64')
+        aggregate.index = self._to_date_index(aggregate.index.to_numpy())
+        return aggregate
+
+    def query(self, case: PatientCase, by: Optional[List[PatientCategory]] = None,
+              where: Optional[Dict[PatientCategory, Union[str, List[str]]]] = None,
+              dates: Optional[Tuple] = None) -> Optional[pd.DataFrame]:
+        """
+        Return the total for each date and each combination of the values of several categories, only for some
+        values of other categories (e.g. the deaths by age and sex in Wallonia :
+        query(PatientCase.death_daily, by=[PatientCategory.age, PatientCategory.sex],
+        where={PatientCategory.geo_level_1: 'Wallonia'})).
+        The totals by date and by categories (rollups) are computed once, from the smallest rollup already computed
+        which has all the categories needed (else from the data), then kept in memory : the next queries on the same
+        categories only select and sum a few rows.
+        :param case:
+        :param by: the categories of the columns [default = None : the whole country, as get_aggregate].
+        :param where: the values kept for some categories (one value or a list of values) [default = None : all].
+        :param dates: the first and the last date kept (None : no limit), e.g. ('2020-10-01', None)
+        [default = None : all the dates].
+        :return: None (data not available for these categories) or the totals (pd.DataFrame), dates x values of the
+        category (one category in by, as get_aggregate) or dates x tuples of values (pd.MultiIndex, several
+        categories). When asked for the country, the only column is 'None'.
+        """
+        by = [category for category in (by or list()) if category != PatientCategory.country]
+        where = {category: [values] if isinstance(values, str) else list(values)
+                 for category, values in (where or dict()).items()}
+        for category in by + list(where.keys()):
+            if category in (PatientCategory.date, PatientCategory.total, PatientCategory.country):
+                raise ValueError('cannot group or filter by ' + category.name)
+
+        # derived case : the query on the base case, then the transform (on all the dates).
+        derivation = self._get_derivation(case)
+        if derivation is not None and (len(by) > 1 or len(where) > 0):
+            result = self.query(derivation[0], by, where)
+            if result is None:
+                return None
+            result = self._derive(result, derivation[1])
+            return result.loc[dates[0]:dates[1]] if dates is not None else result
+
+        # one category : the aggregate (kept in memory and updated by refresh).
+        if len(by) <= 1 and len(where) == 0:
+            aggregate = self.get_aggregate(case, by[0] if by else None)
+            if aggregate is not None and dates is not None:
+                aggregate = aggregate.loc[dates[0]:dates[1]]
+            return aggregate
+
+        # the table which has all the categories, and the rollup on these categories.
+        names = list(dict.fromkeys(category.name for category in by + list(where.keys())))
+        with Instrumentation.span('dao.query', case=case.name, by=str([category.name for category in by])):
+            index = self._find_table(case, names)
+            if index is None:
+                return None
+            table = self.data_dic[case][index]
+            names = tuple(name for name in table.columns if name in names)
+            rollup = self._get_rollup(case, index, names)
+
+            # the dates are the first level of the (sorted) index : the rows kept are contiguous.
+            if dates is not None:
+                first = self._get_day_position(rollup, self._to_day(dates[0])) if dates[0] is not None else 0
+                last = self._get_day_position(rollup, self._to_day(dates[1]) + 1) if dates[1] is not None \
+                    else len(rollup)
+                rollup = rollup.iloc[first:last]
+
+            for category, values in where.items():
+                rollup = rollup[rollup.index.get_level_values(category.name).isin(values)]
+
+            # sum the values of the categories which are not in by.
+            levels = [PatientCategory.date.name] + [category.name for category in by]
+            if len(levels) < rollup.index.nlevels:
+                rollup = rollup.groupby(level=levels, observed=True).sum()
+
+            if by:
+                result = rollup.unstack([category.name for category in by])
+                if len(by) == 1:
+                    result.columns = result.columns.tolist()
+            else:
+                result = rollup.to_frame('None')
+
+            result = result.sort_index().astype('float64')
+            result.index = self._to_date_index(result.index.get_level_values(PatientCategory.date.name).to_numpy())
+            return result
+
+    def _get_rollup(self, case: PatientCase, index: int, names: Tuple[str, ...]) -> pd.Series:
+        """
+        :param case:
+        :param index: the index of the table of the case.
+        :param names: the categories (in the order of the columns of the table).
+        :return: the total for each day and each combination of the values of the categories (index sorted).
+        """
+        key = (case, index, names)
+        rollup = self.dic_rollup.get(key)
+        if rollup is not None:
+            return rollup
+
+        # the smallest rollup already computed with all the categories (else the whole table).
+        list_parents = [parent for parent_key, parent in list(self.dic_rollup.items())
+                        if parent_key[:2] == key[:2] and set(names) <= set(parent_key[2])]
+        if list_parents:
+            parent = min(list_parents, key=len)
+            rollup = parent.groupby(level=[PatientCategory.date.name] + list(names), observed=True).sum() \
+                if len(names) + 1 < parent.index.nlevels else parent
         else:
-            return {current_category: current_table[current_table[category.name] == current_category].groupby(
-                by=[PatientCategory.date.name]).sum()
-                    for current_category in current_table[category.name].unique().tolist() if
-                    str(current_category) != 'nan'}
+            rollup = self._compute_rollup(self.data_dic[case][index], names)
+
+        self.dic_rollup[key] = rollup
+        return rollup
+
+    @staticmethod
+    def _compute_rollup(table: pd.DataFrame, names: Tuple[str, ...], first_day: Optional[int] = None) -> pd.Series:
+        """
+        :param table: the data of a case.
+        :param names: the categories.
+        :param first_day: only the days from this one [default = None : all the days].
+        :return: the total for each day and each combination of the values of the categories.
+        """
+        first_day = first_day if first_day is not None else DataAccessObject.missing_day + 1
+        table = table[table[PatientCategory.date.name].to_numpy() >= first_day]
+        return table.groupby(by=[PatientCategory.date.name] + list(names), observed=True)[
+            PatientCategory.total.name].sum()
+
+    @staticmethod
+    def _get_day_position(rollup: pd.Series, day: int) -> int:
+        """
+        :return: the position of the first row of the rollup from the day.
+        """
+        return int(rollup.index.get_level_values(0).searchsorted(day))
+
+    def _find_table(self, case: PatientCase, names: List[str]) -> Optional[int]:
+        """
+        :param case:
+        :param names: the categories needed.
+        :return: the index of the first table of the case with all the categories (None : no such table).
+        """
+        # the files of the case are loaded the first time.
+        self.load([case])
+        for index, table in enumerate(self.data_dic.get(case, list())):
+            if all(name in table.columns for name in names):
+                return index
+        return None
 
     def get_cases_available(self) -> List[PatientCase]:
         """
         get the list of all the available cases for current object.
-        :return: the list of the cases available for the current country.
+        :return: the list of the cases available for the current country (the cases of the files, then the derived
+        ones, see derived_cases).
         """
         list_cases = [file_info.get_case() for file_info in self.list_file_info]
+        list_cases += [case for case in DataAccessObject.derived_cases if self._get_derivation(case) is not None]
         return list_cases
 
     def get_categories_available_for_case(self, case: PatientCase) -> List[PatientCategory]:
@@ -92,6 +866,7 @@ class DataAccessObject:
         :param case: the available cases for the current country you want to get.
         :return: a list of available categories.
         """
+        case = self._get_base_case(case)
         list_list_categories = [file_info.get_real_category() for file_info in self.list_file_info
                                 if file_info.get_case() == case]
         list_categories = [category for categories in list_list_categories for category in categories]
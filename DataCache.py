@@ -0,0 +1,233 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+DEFAULT_CACHE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'cache')
+
+
+class CacheEntry:
+    """
+    One parsed file stored in the cache, with the information needed to revalidate it with the server.
+    """
+
+    def __init__(self, url: str, table: pd.DataFrame, meta: Dict):
+        self.url: str = url
+        self.table: pd.DataFrame = table
+
+        # meta information (etag, last_modified, fetched_at, tail, ...) see DataCache.store.
+        self.meta: Dict = meta
+
+    def get_validation_headers(self) -> Dict[str, str]:
+        """
+        :return: the headers for a conditional request (the server answers 304 if the file has not changed).
+        """
+        headers = dict()
+        if self.meta.get('etag') is not None:
+            headers['If-None-Match'] = self.meta['etag']
+        if self.meta.get('last_modified') is not None:
+            headers['If-Modified-Since'] = self.meta['last_modified']
+        return headers
+
+
+class DataCache:
+    """
+    Local cache of the parsed files, keyed by url.
+    Each file is stored as a directory of binary columns (one .npy file per column) and a meta.json file.
+    Text columns are stored as integer codes (the values being in meta.json), nullable integer columns as their
+    values and a mask (only if a value is missing), the other columns as they are (see DataAccessObject._parse for the
+    compact types of the dates and of the counts).
+
+    The columns are memory-mapped when loaded (read only) : the table is not copied in the memory of the process, all
+    the processes loading the same entry (GUI, workers of Render or SEIRSweep) share the same pages.
+
+    An entry younger than ttl is used without any network access. An older entry must be revalidated
+    (see CacheEntry.get_validation_headers), but it is still used when the server cannot be reached.
+    When the cache is bigger than max_size, the least recently used entries are removed (the time of the last use is
+    the modification time of the directory of the entry : a load never writes the meta.json file, which the other
+    processes may be reading at the same time).
+    """
+
+    # version of the layout of the entries (the entries of another version are not loaded).
+    format_version: int = 2
+
+    def __init__(self, directory: str = DEFAULT_CACHE_DIRECTORY, ttl: float = 3600.,
+                 max_size: int = 512 * 1024 ** 2):
+        """
+
+        :param directory: the directory of the cache (created if needed).
+        :param ttl: time [s] during which an entry is used without asking the server [default = 1 hour].
+        :param max_size: maximum size [bytes] of the cache on the disk [default = 512 MiB].
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _get_entry_directory(self, url: str) -> str:
+        return os.path.join(self.directory, hashlib.sha1(url.encode('utf-8')).hexdigest())
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """
+        :param entry: the cached entry.
+        :return: True if the entry can be used without revalidation.
+        """
+        return time.time() - entry.meta['fetched_at'] < self.ttl
+
+    def load(self, url: str) -> Optional[CacheEntry]:
+        """
+        Load the cached table for the url.
+        :param url: the http link to the file.
+        :return: None (not in cache) or the entry.
+        """
+        entry_directory = self._get_entry_directory(url)
+        try:
+            with open(os.path.join(entry_directory, 'meta.json')) as meta_file:
+                meta = json.load(meta_file)
+            if meta.get('format') != DataCache.format_version:
+                return None
+
+            data = dict()
+            for index, column in enumerate(meta['columns']):
+                values = np.load(os.path.join(entry_directory, str(index) + '.npy'), mmap_mode='r',
+                                 allow_pickle=False)
+                if column['kind'] == 'category':
+                    values = pd.Categorical.from_codes(values, column['categories'])
+                elif column['kind'] == 'nullable':
+                    mask = np.load(os.path.join(entry_directory, str(index) + '_mask.npy'), mmap_mode='r',
+                                   allow_pickle=False) if column['mask'] else np.zeros(len(values), dtype=bool)
+                    values = pd.arrays.IntegerArray(values, mask)
+                data[column['name']] = values
+        except (OSError, ValueError, KeyError, TypeError):
+            # missing, incomplete or unreadable entry : the file is downloaded again.
+            return None
+
+        # no copy of the columns.
+        table = pd.DataFrame(data, columns=[column['name'] for column in meta['columns']], copy=False)
+
+        # keep track of the use of the entry (for the eviction).
+        try:
+            os.utime(entry_directory)
+        except OSError:
+            pass
+
+        return CacheEntry(url, table, meta)
+
+    def store(self, url: str, table: pd.DataFrame, etag: Optional[str] = None,
+              last_modified: Optional[str] = None, tail: Optional[Dict] = None) -> CacheEntry:
+        """
+        Store (or replace) the table of the url.
+        :param url: the http link to the file.
+        :param table: the parsed file.
+        :param etag: ETag header sent by the server with the file.
+        :param last_modified: Last-Modified header sent by the server with the file.
+        :param tail: where the next refresh of the file starts (see DataAccessObject.refresh).
+        :return: the new entry (its table is memory-mapped, see load).
+        """
+        meta = {'url': url, 'etag': etag, 'last_modified': last_modified, 'fetched_at': time.time(), 'tail': tail,
+                'format': DataCache.format_version, 'columns': list()}
+
+        # write in a temporary directory first : a reader never sees half an entry.
+        temp_directory = tempfile.mkdtemp(dir=self.directory)
+        for index, name in enumerate(table.columns):
+            series = table[name]
+            column = {'name': name}
+            if isinstance(series.dtype, pd.api.extensions.ExtensionDtype) and \
+                    pd.api.types.is_integer_dtype(series.dtype):
+                column['kind'] = 'nullable'
+                mask = series.isna().to_numpy()
+                column['mask'] = bool(mask.any())
+                if column['mask']:
+                    np.save(os.path.join(temp_directory, str(index) + '_mask.npy'), mask, allow_pickle=False)
+                values = series.to_numpy(dtype=series.dtype.numpy_dtype, na_value=0)
+            elif pd.api.types.is_numeric_dtype(series.dtype) or pd.api.types.is_datetime64_dtype(series.dtype):
+                column['kind'] = 'array'
+                values = series.to_numpy()
+            else:
+                column['kind'] = 'category'
+                categorical = series.astype('category').cat
+                column['categories'] = categorical.categories.tolist()
+                values = categorical.codes.to_numpy()
+            np.save(os.path.join(temp_directory, str(index) + '.npy'), values, allow_pickle=False)
+            meta['columns'].append(column)
+        self._write_meta(temp_directory, meta)
+
+        entry_directory = self._get_entry_directory(url)
+        shutil.rmtree(entry_directory, ignore_errors=True)
+        try:
+            os.replace(temp_directory, entry_directory)
+        except OSError:
+            # the previous entry is still mapped by a process (Windows) : the table stays in memory this time.
+            shutil.rmtree(temp_directory, ignore_errors=True)
+            return CacheEntry(url, table, meta)
+
+        self.evict()
+
+        # the table parsed is replaced by the mapped one (shared with the other processes).
+        entry = self.load(url)
+        return entry if entry is not None else CacheEntry(url, table, meta)
+
+    def touch(self, entry: CacheEntry):
+        """
+        Mark the entry as fresh (e.g. the server answered that the file has not changed).
+        :param entry: the cached entry.
+        :return:
+        """
+        entry.meta['fetched_at'] = time.time()
+        try:
+            self._write_meta(self._get_entry_directory(entry.url), entry.meta)
+        except OSError:
+            # entry removed or meta.json opened by another process (Windows) : it will be revalidated next time.
+            pass
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the cache is smaller than max_size.
+        :return:
+        """
+        list_entries: List[List] = list()
+        for name in os.listdir(self.directory):
+            entry_directory = os.path.join(self.directory, name)
+            try:
+                accessed_at = os.path.getmtime(entry_directory)
+                size = sum(os.path.getsize(os.path.join(entry_directory, file_name))
+                           for file_name in os.listdir(entry_directory))
+            except OSError:
+                continue
+            list_entries.append([accessed_at, size, entry_directory])
+
+        total_size = sum(size for _, size, _ in list_entries)
+        for _, size, entry_directory in sorted(list_entries):
+            if total_size <= self.max_size:
+                break
+            shutil.rmtree(entry_directory, ignore_errors=True)
+            total_size -= size
+
+    def clear(self):
+        """
+        Remove all the entries.
+        :return:
+        """
+        for name in os.listdir(self.directory):
+            shutil.rmtree(os.path.join(self.directory, name), ignore_errors=True)
+
+    @staticmethod
+    def _write_meta(entry_directory: str, meta: Dict):
+        """
+        Write meta.json in a temporary file first : a reader (maybe in another process) never sees half a file.
+        """
+        file_descriptor, temp_path = tempfile.mkstemp(suffix='.json', dir=entry_directory)
+        try:
+            with os.fdopen(file_descriptor, 'w') as meta_file:
+                json.dump(meta, meta_file)
+            os.replace(temp_path, os.path.join(entry_directory, 'meta.json'))
+        except OSError:
+            os.remove(temp_path)
+            raise
@@ -14,7 +14,8 @@ class FileInformation:
 
     exclusion_list_real_category = [PatientCategory.date, PatientCategory.total]
 
-    def __init__(self, http_file: str, case: PatientCase, dic_category: Dict[PatientCategory, str]):
+    def __init__(self, http_file: str, case: PatientCase, dic_category: Dict[PatientCategory, str],
+                 na_values: List[str] = None):
 
         # contains the http link to the file.
         self.http_file: str = http_file
@@ -26,6 +27,9 @@ class FileInformation:
         # but several different categories). This has been done to keep data anonymous.
         self.dic_category: Dict[PatientCategory, str] = dic_category
 
+        # values of the file which must be read as missing values (e.g. '<5' when the number is hidden).
+        self.na_values: List[str] = na_values if na_values is not None else list()
+
     def get_case(self):
         return self.case
 
@@ -71,7 +75,8 @@ class DataSource:
                                         PatientCategory.geo_level_2: 'TX_PROV_DESCR_FR',
                                         PatientCategory.geo_level_3: 'TX_DESCR_FR',
                                         PatientCategory.total: 'CASES'
-                                }
+                                },
+                                na_values=['<5']
                         ),
                         FileInformation(
                                 'https://epistat.sciensano.be/Data/COVID19BE_HOSP.csv',
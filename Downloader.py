@@ -0,0 +1,81 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple, TypeVar, TYPE_CHECKING
+
+# requests is only imported when something is downloaded (see Downloader.session).
+if TYPE_CHECKING:
+    import requests
+
+T = TypeVar('T')
+
+
+class Downloader:
+    """
+    This object downloads files through one pooled HTTP session.
+    Several urls can be processed concurrently (see map), each distinct url being processed only once.
+    """
+
+    def __init__(self, max_workers: int = 6, timeout: Tuple[float, float] = (10, 60)):
+        """
+
+        :param max_workers: the maximum number of files downloaded at the same time.
+        :param timeout: seconds to wait for the connection to the server, and then for each part of the content
+        (see requests) [default = (10, 60)].
+        """
+        self.max_workers = max_workers
+        self.timeout = timeout
+
+        # created on the first request (files may all come from the cache).
+        self._session: Optional['requests.Session'] = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self) -> 'requests.Session':
+        """
+        One session for all the files : connections to the same host are kept alive and reused.
+        """
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=self.max_workers, pool_maxsize=self.max_workers)
+                self._session.mount('http://', adapter)
+                self._session.mount('https://', adapter)
+        return self._session
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None, stream: bool = False) -> 'requests.Response':
+        """
+        Send the request for a file.
+        :param url: the http link to the file.
+        :param headers: additional headers (e.g. for a conditional request).
+        :param stream: do not download the content now, it will be read from response.raw [default = False].
+        :return: the response (status 200 or 304), an exception is raised for the other status (or after timeout).
+        With stream, reading the content may raise too (the connection is lost, see DataAccessObject._download_file).
+        """
+        response = self.session.get(url, headers=headers, stream=stream, timeout=self.timeout)
+        response.raise_for_status()
+        if stream:
+            # the content is read as it is sent (already decompressed if needed), the stream stays readable
+            # (empty) at the end of the content.
+            response.raw.decode_content = True
+            response.raw.auto_close = False
+        return response
+
+    def map(self, function: Callable[[str], T], urls: Iterable[str]) -> Dict[str, T]:
+        """
+        Apply the function to each distinct url, concurrently.
+        The total time is about the time of the slowest url, not the sum of all of them.
+        :param function: function taking an url (typically downloading and parsing it).
+        :param urls: the urls to process (duplicates are processed only once).
+        :return: a dic url -> result of the function.
+        """
+        unique_urls = list(dict.fromkeys(urls))
+        if len(unique_urls) == 0:
+            return dict()
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(unique_urls))) as executor:
+            futures = {url: executor.submit(function, url) for url in unique_urls}
+
+        return {url: future.result() for url, future in futures.items()}
@@ -3,14 +3,17 @@ from enum import Enum, auto
 
 class Country(bytes, Enum):
 
-    def __new__(cls, value, sep):
+    def __new__(cls, value, sep, encoding, date_format, iso_code):
         obj = bytes.__new__(cls, [value])
         obj._value_ = value
         obj.sep = sep
+        obj.encoding = encoding
+        obj.date_format = date_format
+        obj.iso_code = iso_code     # ISO 3166-1 alpha-3 (see Population).
         return obj
 
-    belgium = (1, ',')
-    france = (2, ';')
+    belgium = (1, ',', 'latin_1', '%Y-%m-%d', 'BEL')
+    france = (2, ';', 'latin_1', '%Y-%m-%d', 'FRA')
 
 
 class DataForm(Enum):
@@ -1,15 +1,20 @@
 import sys
-from typing import List
+from typing import Dict, List, Optional, TYPE_CHECKING
 
 from matplotlib.backends.qt_compat import QtCore, QtWidgets
 from matplotlib.backends.backend_qt5agg import (FigureCanvas, NavigationToolbar2QT as NavigationToolbar)
 
 from matplotlib.figure import Figure
 
-from AxesPlotter import AxesPlotter
-from DataAccessObject import DataAccessObject
+import Instrumentation
 from Enums import Country, PatientCase, PatientCategory, DataForm
 
+# the data (pandas, requests) and the plotter are only imported when a country is selected : the window shows first.
+if TYPE_CHECKING:
+    from AxesPlotter import AxesPlotter
+    from DataAccessObject import DataAccessObject
+    from Transform import Pipeline
+
 
 def unique_list(l: List):
     list_unique = []
@@ -20,7 +25,52 @@ def unique_list(l: List):
     return list_unique
 
 
+class DataLoaderSignals(QtCore.QObject):
+    """
+    Signals of DataLoader (a QRunnable cannot emit signals itself).
+    """
+    loaded = QtCore.Signal(object, object)      # (country, data access object)
+    failed = QtCore.Signal(object, str)         # (country, error message)
+
+
+class DataLoader(QtCore.QRunnable):
+    """
+    Build the data access object of a country and load the files of some cases (download the data) outside of the
+    Qt event loop.
+    """
+
+    def __init__(self, country: Country, dao: Optional['DataAccessObject'] = None,
+                 cases: Optional[List[PatientCase]] = None):
+        """
+
+        :param country: the country.
+        :param dao: the data access object of the country [default = None : a new one].
+        :param cases: the cases to load [default = None : nothing is loaded, see DataAccessObject.load].
+        """
+        super().__init__()
+        self.country = country
+        self.dao = dao
+        self.cases = cases
+        self.signals = DataLoaderSignals()
+
+    def run(self):
+        try:
+            dao = self.dao
+            if dao is None:
+                from DataAccessObject import DataAccessObject
+                dao = DataAccessObject(self.country)
+            if self.cases:
+                dao.load(self.cases)
+        except Exception as error:
+            self.signals.failed.emit(self.country, str(error))
+        else:
+            self.signals.loaded.emit(self.country, dao)
+
+
 class ApplicationWindow(QtWidgets.QMainWindow):
+    # maximum number of lines for one plot (the smallest series are drawn together, see AxesPlotter).
+    top_n = 20
+
     def __init__(self):
         super().__init__()
         self._main = QtWidgets.QWidget()
@@ -54,6 +104,24 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.check_cumsum = QtWidgets.QCheckBox('Cumulative sum')
         self.check_log = QtWidgets.QCheckBox('Log plot')
 
+        # transforms of the data (see Transform), used by the next plots.
+        self.check_rolling_mean = QtWidgets.QCheckBox('7-day mean')
+        self.check_per_capita = QtWidgets.QCheckBox('Per 100k inhabitants')
+        self.check_rolling_mean.setToolTip('Used by the next plots')
+        self.check_per_capita.setToolTip('Used by the next plots (only for the whole country : the population of '
+                                         'the regions, ages, ... is not known)')
+        self.check_per_capita.setEnabled(False)
+
+        # busy indicator while the data of a country are loaded.
+        self.progress_bar = QtWidgets.QProgressBar()
+        self.progress_bar.setRange(0, 0)
+        self.progress_bar.setVisible(False)
+
+        # where the time of the last action went (only when the instrumentation is enabled, see Instrumentation).
+        self.profile_label = QtWidgets.QLabel()
+        if Instrumentation.is_enabled():
+            self.statusBar().addPermanentWidget(self.profile_label)
+
         # widget size
         width = 200
         self.list_select_country.setMaximumWidth(width)
@@ -64,6 +132,9 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         self.clear_and_plot_button.setMaximumWidth(width)
         self.check_cumsum.setMaximumWidth(width)
         self.check_log.setMaximumWidth(width)
+        self.check_rolling_mean.setMaximumWidth(width)
+        self.check_per_capita.setMaximumWidth(width)
+        self.progress_bar.setMaximumWidth(width)
 
         # fill the lists.
         for country in Country:
@@ -80,6 +151,10 @@ class ApplicationWindow(QtWidgets.QMainWindow):
 
         self.layout_button.addWidget(self.check_cumsum)
         self.layout_button.addWidget(self.check_log)
+        self.layout_button.addWidget(self.check_rolling_mean)
+        self.layout_button.addWidget(self.check_per_capita)
+
+        self.layout_button.addWidget(self.progress_bar)
 
         self.layout_button_fig.addLayout(self.layout_button)
         self.layout_button_fig.addLayout(self.layout_fig)
@@ -87,13 +162,30 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         # map(action -> method)
         self.list_select_country.itemClicked.connect(self.select_country)
         self.list_select_case.itemClicked.connect(self.select_case)
+        self.list_select_category.currentItemChanged.connect(self.select_category)
         self.plot_button.clicked.connect(self.plot)
         self.clear_button.clicked.connect(self.clear_fig)
         self.clear_and_plot_button.clicked.connect(self.clear_and_plot)
+        self.check_cumsum.toggled.connect(self.update_style)
+        self.check_log.toggled.connect(self.update_style)
 
         # country data.
         self.dataAO = None
-        self.plotter = None
+        self.plotter: Optional['AxesPlotter'] = None
+
+        # data access object of each country already loaded (switching back to a country is instant).
+        self.dic_dao: Dict[Country, 'DataAccessObject'] = dict()
+
+        # loaders started but not finished, and the last country clicked.
+        self.thread_pool = QtCore.QThreadPool.globalInstance()
+        self.dic_loader: Dict[Country, DataLoader] = dict()
+        self.country_requested: Optional[Country] = None
+
+        # loader of the files of the case to plot (see load_case).
+        self.case_loader: Optional[DataLoader] = None
+
+        # statistics of the instrumentation when the last country was clicked.
+        self.profile_start: Dict = dict()
 
     # ------------------
     #  Events Management
@@ -103,7 +195,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         """
         When clicked on a country,
         we change the data access object.
-        (will download last data).
+        (will download last data in the background if the country has not been loaded yet).
         :param item:
         :return:
         """
@@ -113,8 +205,69 @@ class ApplicationWindow(QtWidgets.QMainWindow):
                 country_selected = country
                 continue
 
+        self.country_requested = country_selected
+        self.profile_start = Instrumentation.get_stats()
+
+        # clear list of cases and category
+        self.list_select_case.clear()
+        self.list_select_category.clear()
+
+        if country_selected in self.dic_dao:
+            self.set_country(country_selected)
+            return
+
+        # nothing can be plotted until the data are loaded.
+        self.dataAO = None
+
+        # the loaders of the other countries are not needed anymore (the ones already running cannot be stopped,
+        # their data will be kept for later).
+        for country, loader in list(self.dic_loader.items()):
+            if country != country_selected and self.thread_pool.tryTake(loader):
+                del self.dic_loader[country]
+
+        if country_selected not in self.dic_loader:
+            loader = DataLoader(country_selected)
+            loader.signals.loaded.connect(self.country_loaded)
+            loader.signals.failed.connect(self.country_failed)
+            self.dic_loader[country_selected] = loader
+            self.thread_pool.start(loader)
+
+        self.progress_bar.setVisible(True)
+        self.statusBar().showMessage('Loading ' + country_selected.name + '...')
+
+    def country_loaded(self, country: Country, dao: 'DataAccessObject'):
+        """
+        When the data of a country have been loaded (in the background).
+        :param country:
+        :param dao:
+        :return:
+        """
+        self.dic_loader.pop(country, None)
+        self.dic_dao[country] = dao
+
+        # the user may have clicked on another country in the meantime.
+        if country == self.country_requested:
+            self.set_country(country)
+
+    def country_failed(self, country: Country, message: str):
+        self.dic_loader.pop(country, None)
+
+        if country == self.country_requested:
+            self.progress_bar.setVisible(False)
+            self.statusBar().showMessage('Data of ' + country.name + ' not available : ' + message)
+
+    def set_country(self, country: Country):
+        """
+        Use the (loaded) data of the country.
+        :param country:
+        :return:
+        """
         # change the data access object
-        self.dataAO = DataAccessObject(country_selected)
+        self.dataAO = self.dic_dao[country]
+        self.show_profile(self.profile_start)
+
+        self.progress_bar.setVisible(False)
+        self.statusBar().clearMessage()
 
         # update list of cases available for the country
         list_cases = unique_list(self.dataAO.get_cases_available())
@@ -138,6 +291,9 @@ class ApplicationWindow(QtWidgets.QMainWindow):
             if case.name == self.list_select_case.currentItem().text():
                 case_selected = case
 
+        # the files of the case are downloaded while the category is chosen.
+        self.dataAO.prefetch([case_selected])
+
         # get the list of categories for current case and country.
         list_category = self.dataAO.get_categories_available_for_case(case_selected)
 
@@ -148,6 +304,12 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         for category in list_category:
             self.list_select_category.addItem(QtWidgets.QListWidgetItem(category.name))
 
+    def select_category(self, item):
+        """
+        Per capita is only available for the whole country (see Transform.PerCapita).
+        """
+        self.check_per_capita.setEnabled(item is not None and item.text() == PatientCategory.country.name)
+
     def plot(self):
         """
         When clicked on the plot button.
@@ -157,6 +319,7 @@ class ApplicationWindow(QtWidgets.QMainWindow):
         if self.dataAO is not None \
                 and self.list_select_case.currentItem() is not None \
                 and self.list_select_category.currentItem() is not None:
+            profile_start = Instrumentation.get_stats()
 
             # find current case
             current_case = None
@@ -172,40 +335,109 @@ class ApplicationWindow(QtWidgets.QMainWindow):
                     current_category = category
                     continue
 
-            # plot figure.
-            self.plotter = AxesPlotter(self.dataAO)
+            # the files of the case are loaded first (in the background), then the plot is done again.
+            if not self.dataAO.is_loaded(current_case):
+                self.load_case(current_case)
+                return
+
+            # plot figure (the plotter keeps the lines of all the countries).
+            if self.plotter is None:
+                from AxesPlotter import AxesPlotter
+                self.plotter = AxesPlotter(self.dataAO, level_of_detail=True, top_n=self.top_n)
+            self.plotter.dao = self.dataAO
             self.plotter.plot(self.fig_ax,
                               (current_case, current_category),
                               cumsum=self.check_cumsum.isChecked(),
-                              log=self.check_log.isChecked())
+                              log=self.check_log.isChecked(),
+                              pipeline=self.get_pipeline())
 
             # make dates readable (rotation)
             self.fig_ax.figure.autofmt_xdate()
 
-            # if already cumsum (original data) -> check the box
+            # if already cumsum (original data) -> check the box (the lines already plotted are not changed).
             if current_case.get_data_form != DataForm.daily_incidence:
+                self.check_cumsum.blockSignals(True)
                 self.check_cumsum.setChecked(True)
+                self.check_cumsum.blockSignals(False)
 
-            # repaint the figure and update the window
-            self.fig_ax.figure.canvas.draw()
-            self.repaint()
+            # repaint the figure when the event loop is idle.
+            self.figure_canvas.draw_idle()
+            self.show_profile(profile_start)
+
+    def get_pipeline(self) -> 'Pipeline':
+        """
+        :return: the transforms checked (see Transform).
+        """
+        from Transform import Pipeline, PerCapita, RollingMean
+        list_steps = list()
+        if self.check_rolling_mean.isChecked():
+            list_steps.append(RollingMean(7))
+        if self.check_per_capita.isEnabled() and self.check_per_capita.isChecked():
+            list_steps.append(PerCapita())
+        return Pipeline(*list_steps)
+
+    def update_style(self):
+        """
+        When the cumsum or log box is changed : the lines are updated in place.
+        :return:
+        """
+        if self.plotter is not None:
+            profile_start = Instrumentation.get_stats()
+            self.plotter.update_style(self.fig_ax,
+                                      cumsum=self.check_cumsum.isChecked(),
+                                      log=self.check_log.isChecked())
+            self.figure_canvas.draw_idle()
+            self.show_profile(profile_start)
 
     def clear_fig(self):
         """
         to clear the figure.
         :return:
         """
-        # clear the axes.
-        self.fig_ax.clear()
+        # hide the lines of the axes (kept to be shown again).
+        if self.plotter is not None:
+            self.plotter.clear(self.fig_ax)
 
-        # repaint the figure and update the window
-        self.fig_ax.figure.canvas.draw()
-        self.repaint()
+        # repaint the figure when the event loop is idle.
+        self.figure_canvas.draw_idle()
 
     def clear_and_plot(self):
         self.clear_fig()
         self.plot()
 
+    def load_case(self, case: PatientCase):
+        """
+        Load the files of the case of the current country in the background, then plot.
+        :param case:
+        :return:
+        """
+        # kept until it is finished (its signals would be deleted with it).
+        self.case_loader = DataLoader(self.dataAO.country, self.dataAO, [case])
+        self.case_loader.signals.loaded.connect(self.case_loaded)
+        self.case_loader.signals.failed.connect(self.country_failed)
+        self.thread_pool.start(self.case_loader)
+
+        self.progress_bar.setVisible(True)
+        self.statusBar().showMessage('Loading ' + case.name + '...')
+
+    def case_loaded(self, country: Country, dao: 'DataAccessObject'):
+        self.case_loader = None
+        self.progress_bar.setVisible(False)
+        self.statusBar().clearMessage()
+
+        # the user may have clicked on another country in the meantime.
+        if dao is self.dataAO:
+            self.plot()
+
+    def show_profile(self, profile_start: Dict):
+        """
+        Show in the status bar the slowest stages since profile_start (see Instrumentation.get_summary).
+        :param profile_start: the statistics of the instrumentation at the beginning of the action.
+        :return:
+        """
+        if Instrumentation.is_enabled():
+            self.profile_label.setText(Instrumentation.get_summary(profile_start))
+
 
 if __name__ == "__main__":
     qapp = QtWidgets.QApplication(sys.argv)
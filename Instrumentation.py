@@ -0,0 +1,239 @@
+"""
+Opt-in timing of the stages of the software (download, parsing, aggregation, plot, model).
+
+    with Instrumentation.span('dao.read_csv', url=url):
+        ...
+    Instrumentation.count('rows_parsed', len(table))
+
+Disabled by default : span then returns the same empty context manager (no timing, nothing stored).
+It is enabled by enable() or by the environment variable COVID_PROFILE :
+    - COVID_PROFILE=1 : enabled (see get_stats, dump_json, dump_chrome_trace).
+    - COVID_PROFILE=<file> : enabled, and the results are written to the file when the process exits (Chrome trace
+      format if the file ends with '.trace.json', to open in chrome://tracing or https://ui.perfetto.dev, else a
+      json summary).
+"""
+import atexit
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+ENVIRONMENT_VARIABLE = 'COVID_PROFILE'
+
+# maximum number of spans kept for the trace (the statistics are always complete).
+max_events = 200000
+
+_enabled = False
+_lock = threading.Lock()
+
+# name -> [calls, total time [s], max time [s]].
+_dic_stats: Dict[str, List[float]] = dict()
+
+# name -> value (e.g. bytes downloaded, rows parsed).
+_dic_counters: Dict[str, float] = dict()
+
+# events of the trace : (phase, name, start [s], duration [s] or value, thread, args). The phase is 'X' for the
+# spans, 'C' for the counters (as in the Chrome trace format, see dump_chrome_trace).
+_list_events: List[Tuple[str, str, float, float, int, Optional[Dict]]] = list()
+
+# origin of the times of the trace.
+_origin = time.perf_counter()
+
+_null_span = contextlib.nullcontext()
+
+
+class Span:
+    """
+    Time the code in a with statement (see span).
+    """
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name: str, args: Dict):
+        self.name = name
+        self.args = args
+        self.start = 0.
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info) -> bool:
+        end = time.perf_counter()
+        duration = end - self.start
+        with _lock:
+            stats = _dic_stats.get(self.name)
+            if stats is None:
+                _dic_stats[self.name] = [1, duration, duration]
+            else:
+                stats[0] += 1
+                stats[1] += duration
+                stats[2] = max(stats[2], duration)
+
+            if len(_list_events) < max_events:
+                _list_events.append(('X', self.name, self.start, duration, threading.get_ident(), self.args))
+        return False
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset():
+    """
+    Forget all the spans and counters recorded.
+    """
+    with _lock:
+        _dic_stats.clear()
+        _dic_counters.clear()
+        _list_events.clear()
+
+
+def span(name: str, **args):
+    """
+    Context manager timing a stage.
+    :param name: the name of the stage (e.g. 'dao.read_csv'), the statistics are grouped by name.
+    :param args: details shown in the trace (e.g. the url).
+    :return: the context manager (an empty one when disabled).
+    """
+    if not _enabled:
+        return _null_span
+    return Span(name, args)
+
+
+def timed(name: str):
+    """
+    Decorator timing each call of a function (see span).
+    :param name: the name of the stage.
+    :return: the decorator.
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with Span(name, dict()):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def count(name: str, value: float = 1):
+    """
+    Add value to the counter name (nothing when disabled).
+    :param name: the name of the counter (e.g. 'bytes_downloaded').
+    :param value: the value added [default = 1].
+    :return:
+    """
+    if not _enabled:
+        return
+    with _lock:
+        total = _dic_counters.get(name, 0) + value
+        _dic_counters[name] = total
+        if len(_list_events) < max_events:
+            _list_events.append(('C', name, time.perf_counter(), total, threading.get_ident(), None))
+
+
+def get_stats() -> Dict[str, Tuple[int, float, float]]:
+    """
+    :return: name -> (calls, total time [s], max time [s]) of the spans recorded.
+    """
+    with _lock:
+        return {name: (int(stats[0]), stats[1], stats[2]) for name, stats in _dic_stats.items()}
+
+
+def get_counters() -> Dict[str, float]:
+    """
+    :return: name -> value of the counters.
+    """
+    with _lock:
+        return dict(_dic_counters)
+
+
+def get_summary(previous: Optional[Dict[str, Tuple[int, float, float]]] = None, n_stages: int = 4) -> str:
+    """
+    One line describing where the time went (e.g. for a status bar).
+    :param previous: statistics returned by get_stats before the action : only the spans since then are shown
+    [default = None : all the spans].
+    :param n_stages: number of stages shown (the slowest ones) [default = 4].
+    :return: e.g. 'dao.read_csv 1.20 s (3x) | dao.aggregate 0.31 s (12x)'.
+    """
+    previous = previous if previous is not None else dict()
+    list_stages = list()
+    for name, (calls, total, _) in get_stats().items():
+        calls -= previous.get(name, (0, 0., 0.))[0]
+        total -= previous.get(name, (0, 0., 0.))[1]
+        if calls > 0:
+            list_stages.append((total, calls, name))
+
+    list_stages.sort(reverse=True)
+    return ' | '.join('%s %.2f s (%dx)' % (name, total, calls) for total, calls, name in list_stages[:n_stages])
+
+
+def dump_json(path: str):
+    """
+    Write the statistics of the spans and the counters in a json file.
+    :param path: the file.
+    :return:
+    """
+    stats = {name: {'calls': calls, 'total': total, 'mean': total / calls, 'max': maximum}
+             for name, (calls, total, maximum) in get_stats().items()}
+    with open(path, 'w') as json_file:
+        json.dump({'spans': stats, 'counters': get_counters()}, json_file, indent=4, sort_keys=True)
+
+
+def dump_chrome_trace(path: str):
+    """
+    Write the spans and the counters in the Chrome trace format (chrome://tracing, https://ui.perfetto.dev).
+    :param path: the file.
+    :return:
+    """
+    pid = os.getpid()
+    with _lock:
+        events = [{'name': name, 'ph': phase, 'pid': pid, 'tid': thread, 'ts': (start - _origin) * 1e6,
+                   'dur': value * 1e6, 'args': args} if phase == 'X' else
+                  {'name': name, 'ph': phase, 'pid': pid, 'tid': thread, 'ts': (start - _origin) * 1e6,
+                   'args': {name: value}}
+                  for phase, name, start, value, thread, args in _list_events]
+    with open(path, 'w') as json_file:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, json_file, default=str)
+
+
+def dump(path: str):
+    """
+    Write the results : Chrome trace format if the file ends with '.trace.json', else the json summary.
+    :param path: the file.
+    :return:
+    """
+    if path.endswith('.trace.json'):
+        dump_chrome_trace(path)
+    else:
+        dump_json(path)
+
+
+def _dump_at_exit(path: str):
+    """
+    Write the results of the main process (the workers of Render or SEIRSweep do not overwrite them).
+    """
+    import multiprocessing
+    if multiprocessing.parent_process() is None:
+        dump(path)
+
+
+_environment_value = os.environ.get(ENVIRONMENT_VARIABLE, '')
+if _environment_value not in ('', '0'):
+    enable()
+    if _environment_value != '1':
+        atexit.register(_dump_at_exit, _environment_value)
@@ -0,0 +1,136 @@
+import csv
+import os
+import tempfile
+from typing import Dict, Optional
+
+import numpy as np
+
+from Enums import Country
+
+DEFAULT_POPULATION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data',
+                                       'population_by_country_world_bank.csv')
+
+
+class PopulationTable:
+    """
+    Population of each country (ISO 3166-1 alpha-3 code) for each year, from the world bank file.
+    The csv file is parsed once, the table is then stored next to it (.npz sidecar) : the next processes load it
+    directly (see get_population_table).
+    """
+
+    def __init__(self, codes: np.ndarray, years: np.ndarray, values: np.ndarray):
+        """
+
+        :param codes: the ISO codes of the countries (rows of values).
+        :param years: the years (columns of values).
+        :param values: the population (NaN when unknown), shape (len(codes), len(years)).
+        """
+        self.codes = codes
+        self.years = years
+        self.values = values
+
+        # ISO code -> row, year -> column.
+        self.dic_row: Dict[str, int] = {code: row for row, code in enumerate(codes.tolist())}
+        self.dic_column: Dict[int, int] = {year: column for column, year in enumerate(years.tolist())}
+
+    def get(self, iso_code: str, year: Optional[int] = None) -> int:
+        """
+        :param iso_code: the ISO code of the country (e.g. 'BEL').
+        :param year: the year [default = None : the last year known for this country].
+        :return: the population.
+        """
+        if iso_code not in self.dic_row:
+            raise KeyError('unknown country code : ' + iso_code)
+        values = self.values[self.dic_row[iso_code]]
+
+        if year is None:
+            known = np.flatnonzero(~np.isnan(values))
+            if len(known) == 0:
+                raise ValueError('no population for ' + iso_code)
+            return int(values[known[-1]])
+
+        if year not in self.dic_column:
+            raise KeyError('no data for the year ' + str(year) + ' (' + str(self.years[0]) + ' - ' +
+                           str(self.years[-1]) + ')')
+        value = values[self.dic_column[year]]
+        if np.isnan(value):
+            raise ValueError('no population for ' + iso_code + ' in ' + str(year))
+        return int(value)
+
+    @staticmethod
+    def parse(path: str) -> 'PopulationTable':
+        """
+        Parse the world bank csv file (one row per country, one column per year).
+        :param path: the csv file.
+        :return: the table.
+        """
+        with open(path, newline='', encoding='utf-8-sig') as csv_file:
+            reader = csv.reader(csv_file)
+            header = next(reader)
+            columns = [index for index, name in enumerate(header) if name.isdigit()]
+            code_column = header.index('Country Code')
+
+            list_codes, list_values = list(), list()
+            for row in reader:
+                if len(row) <= code_column:
+                    continue
+                list_codes.append(row[code_column])
+                list_values.append([float(row[index]) if index < len(row) and row[index] != '' else np.nan
+                                    for index in columns])
+
+        return PopulationTable(np.array(list_codes), np.array([int(header[index]) for index in columns]),
+                               np.array(list_values, dtype=float).reshape(len(list_codes), len(columns)))
+
+    @staticmethod
+    def load(path: str) -> 'PopulationTable':
+        """
+        Load the table of the csv file from its sidecar (parse the csv file and write the sidecar if it is missing
+        or older than the csv file).
+        :param path: the csv file.
+        :return: the table.
+        """
+        sidecar_path = os.path.splitext(path)[0] + '.npz'
+        try:
+            if os.path.getmtime(sidecar_path) >= os.path.getmtime(path):
+                with np.load(sidecar_path, allow_pickle=False) as sidecar:
+                    return PopulationTable(sidecar['codes'], sidecar['years'], sidecar['values'])
+        except (OSError, ValueError, KeyError):
+            pass
+
+        table = PopulationTable.parse(path)
+
+        # write in a temporary file first : a reader never sees half a file.
+        try:
+            file_descriptor, temp_path = tempfile.mkstemp(suffix='.npz', dir=os.path.dirname(sidecar_path))
+            with os.fdopen(file_descriptor, 'wb') as temp_file:
+                np.savez(temp_file, codes=table.codes, years=table.years, values=table.values)
+            os.replace(temp_path, sidecar_path)
+        except OSError:
+            # read only directory : the file will be parsed again next time.
+            pass
+
+        return table
+
+
+# tables already loaded in this process, path -> table.
+_dic_table: Dict[str, PopulationTable] = dict()
+
+
+def get_population_table(path: str = DEFAULT_POPULATION_FILE) -> PopulationTable:
+    """
+    :param path: the csv file [default = the world bank file of the repository].
+    :return: the table (loaded once per process).
+    """
+    if path not in _dic_table:
+        _dic_table[path] = PopulationTable.load(path)
+    return _dic_table[path]
+
+
+def get_population(country: Country, year: Optional[int] = None, path: str = DEFAULT_POPULATION_FILE) -> int:
+    """
+    :param country: the country.
+    :param year: the year [default = None : the last year known].
+    :param path: the csv file [default = the world bank file of the repository].
+    :return: the population of the country.
+    """
+    return get_population_table(path).get(country.iso_code, year)
@@ -0,0 +1,133 @@
+import argparse
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import matplotlib
+
+# headless : no window, no Qt.
+matplotlib.use('Agg')
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import Instrumentation
+from AxesPlotter import AxesPlotter
+from DataAccessObject import DataAccessObject
+from Enums import Country, PatientCase, PatientCategory
+from Transform import Pipeline
+
+formats = ('png', 'svg')
+
+# data access objects of the worker, created once per country and reused for all the figures (see _get_dao).
+_worker_dao: Dict[Country, DataAccessObject] = dict()
+
+
+def _get_dao(country: Country) -> DataAccessObject:
+    if country not in _worker_dao:
+        _worker_dao[country] = DataAccessObject(country)
+    return _worker_dao[country]
+
+
+def get_file_name(figure: Dict) -> str:
+    """
+    :param figure: one item of the spec (see render).
+    :return: the name of the file (without extension).
+    """
+    if figure.get('name') is not None:
+        return figure['name']
+    return '_'.join([figure['country'], figure['case'], figure.get('category', PatientCategory.country.name)] +
+                    (['cumsum'] if figure.get('cumsum', False) else []) + (['log'] if figure.get('log', False) else []) +
+                    [step.name for step in Pipeline.parse(figure.get('transform', list())).steps])
+
+
+def _render_figure(figure: Dict, path: str, top_n: Optional[int], size: List[float], dpi: float) -> str:
+    """
+    Render one figure in a worker process.
+    :return: the path of the file.
+    """
+    dao = _get_dao(Country[figure['country']])
+
+    fig = Figure(figsize=size, dpi=dpi)
+    FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+
+    plotter = AxesPlotter(dao, level_of_detail=True, top_n=top_n)
+    plotter.plot(ax, (PatientCase[figure['case']],
+                      PatientCategory[figure.get('category', PatientCategory.country.name)]),
+                 cumsum=figure.get('cumsum', False),
+                 log=figure.get('log', False),
+                 pipeline=Pipeline.parse(figure.get('transform', list())))
+
+    # make dates readable (rotation)
+    fig.autofmt_xdate()
+
+    with Instrumentation.span('render.savefig', path=path):
+        fig.savefig(path)
+    return path
+
+
+def render(spec: List[Dict], output_directory: str, file_format: str = 'png', workers: Optional[int] = None,
+           top_n: Optional[int] = None, size: List[float] = (10, 7), dpi: float = 100) -> List[str]:
+    """
+    Render the figures of the spec to files, in parallel processes.
+    The files of each country are downloaded once (here, they are then in the cache, see DataCache), each worker
+    loads them from the cache once and uses them for all its figures.
+    :param spec: the figures, e.g. {"country": "belgium", "case": "positive_to_covid_daily", "category": "age",
+    "cumsum": false, "log": true, "transform": [["rolling_mean", 7], "per_capita"], "name": "cases_by_age"}.
+    category (default = country), cumsum, log (default = false), transform (default = none, see Pipeline.parse) and
+    name (default = see get_file_name) are optional.
+    :param output_directory: the directory of the files (created if needed).
+    :param file_format: png or svg [default = png].
+    :param workers: number of processes [default = number of cpu].
+    :param top_n: maximum number of lines of one figure (see AxesPlotter) [default = no limit].
+    :param size: size of the figures [inches].
+    :param dpi: resolution of the figures.
+    :return: the paths of the files.
+    """
+    if file_format not in formats:
+        raise ValueError('file_format must be one of ' + str(formats))
+
+    # check the spec before starting.
+    for figure in spec:
+        Country[figure['country']], PatientCase[figure['case']]
+        category = PatientCategory[figure.get('category', PatientCategory.country.name)]
+        if not Pipeline.parse(figure.get('transform', list())).is_available(category):
+            raise ValueError('per_capita needs the population of each value of ' + category.name +
+                             ' : only the population of the country is known')
+
+    os.makedirs(output_directory, exist_ok=True)
+
+    # one download for all the workers (only the files of the cases plotted).
+    for name in dict.fromkeys(figure['country'] for figure in spec):
+        DataAccessObject(Country[name]).load(PatientCase[figure['case']] for figure in spec
+                                             if figure['country'] == name)
+
+    list_paths = list()
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as executor:
+        futures = [executor.submit(_render_figure, figure,
+                                   os.path.join(output_directory, get_file_name(figure) + '.' + file_format),
+                                   top_n, list(size), dpi)
+                   for figure in spec]
+        for future in as_completed(futures):
+            list_paths.append(future.result())
+
+    return list_paths
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Render figures to files, without any window.')
+    parser.add_argument('spec', help='json file with the list of the figures (see render).')
+    parser.add_argument('--output', default='figures', help='output directory.')
+    parser.add_argument('--format', default='png', choices=formats)
+    parser.add_argument('--workers', type=int, default=None, help='number of processes [default = cpu count].')
+    parser.add_argument('--top_n', type=int, default=None, help='maximum number of lines of one figure.')
+    parser.add_argument('--dpi', type=float, default=100)
+    args = parser.parse_args()
+
+    with open(args.spec) as spec_file:
+        list_figures = json.load(spec_file)
+
+    paths = render(list_figures, args.output, args.format, args.workers, args.top_n, dpi=args.dpi)
+    print(str(len(paths)) + ' figures written to ' + args.output)
@@ -0,0 +1,158 @@
+from typing import Sequence, Tuple, Union
+
+import numpy as np
+
+Value = Union[float, np.ndarray]
+
+
+class SEIRIntegrator:
+    """
+    Fixed step integrator (Runge-Kutta 4) of the SEIR equations (see SEIRModel) when Re is constant over each day.
+    The state is advanced day by day with sub_steps steps per day, without any callback from a solver.
+
+    The values (state and Re) can be floats or arrays of the same shape : several trajectories (e.g. several
+    candidate values of Re) are then integrated at once.
+    """
+
+    def __init__(self, sigma: float, gamma: float, N: float, sub_steps: int = 4):
+        """
+
+        :param sigma: infection rate (inverse of the mean latent period) [/day].
+        :param gamma: recovery rate (inverse of the infectious period) [/day].
+        :param N: total population.
+        :param sub_steps: number of steps per day [default = 4].
+        """
+        self.sigma = sigma
+        self.gamma = gamma
+        self.N = N
+        self.sub_steps = sub_steps
+
+    def integrate(self, y_0: Sequence[Value], Re: Sequence[Value]) -> np.ndarray:
+        """
+        Integrate the equations over len(Re) days.
+        :param y_0: the state [S, E, I, R] at the beginning of the first day.
+        :param Re: Re for each day.
+        :return: the state at the beginning of each day and at the end of the last day, shape (len(Re) + 1, 4)
+        (+ shape of the values when they are arrays).
+        """
+        S, E, I, R = [float(item) if np.ndim(item) == 0 else np.asarray(item, dtype=float) for item in y_0]
+        Re = [float(item) if np.ndim(item) == 0 else np.asarray(item, dtype=float) for item in Re]
+
+        shape = ()
+        for item in [S, E, I, R] + Re:
+            if np.ndim(item) > 0:
+                shape = np.broadcast(np.empty(shape), item).shape
+
+        # floats are much faster than 0-d arrays : the states are converted to an array at the end only.
+        list_states = [(S, E, I, R)]
+
+        h = 1. / self.sub_steps
+        sigma, gamma, N = self.sigma, self.gamma, self.N
+        for Re_day in Re:
+            beta = Re_day * gamma / N
+            for _ in range(self.sub_steps):
+                # k1
+                infection = beta * I * S
+                dS1, dE1, dI1 = -infection, infection - sigma * E, sigma * E - gamma * I
+                # k2
+                S2, E2, I2 = S + h / 2 * dS1, E + h / 2 * dE1, I + h / 2 * dI1
+                infection = beta * I2 * S2
+                dS2, dE2, dI2 = -infection, infection - sigma * E2, sigma * E2 - gamma * I2
+                # k3
+                S3, E3, I3 = S + h / 2 * dS2, E + h / 2 * dE2, I + h / 2 * dI2
+                infection = beta * I3 * S3
+                dS3, dE3, dI3 = -infection, infection - sigma * E3, sigma * E3 - gamma * I3
+                # k4
+                S4, E4, I4 = S + h * dS3, E + h * dE3, I + h * dI3
+                infection = beta * I4 * S4
+                dS4, dE4, dI4 = -infection, infection - sigma * E4, sigma * E4 - gamma * I4
+
+                # dR = gamma I
+                R = R + h / 6 * gamma * (I + 2 * I2 + 2 * I3 + I4)
+                S = S + h / 6 * (dS1 + 2 * dS2 + 2 * dS3 + dS4)
+                E = E + h / 6 * (dE1 + 2 * dE2 + 2 * dE3 + dE4)
+                I = I + h / 6 * (dI1 + 2 * dI2 + 2 * dI3 + dI4)
+
+            list_states.append((S, E, I, R))
+
+        if shape == ():
+            return np.array(list_states)
+
+        states = np.empty((len(list_states), 4) + shape)
+        for day, state in enumerate(list_states):
+            for index, item in enumerate(state):
+                states[day, index] = item
+        return states
+
+    def integrate_sensitivity(self, y_0: Sequence[float], Re: Sequence[float]) -> Tuple[np.ndarray, np.ndarray,
+                                                                                          np.ndarray]:
+        """
+        Integrate the equations over len(Re) days (as integrate, floats only) and the sensitivity of each day :
+        the derivatives of the state at the end of the day with respect to the state at the beginning of the day
+        and to Re of the day. They are the exact derivatives of the RK4 steps (tangent linear model).
+        :param y_0: the state [S, E, I, R] at the beginning of the first day.
+        :param Re: Re for each day.
+        :return: the states (shape (len(Re) + 1, 4)), d state(day + 1) / d state(day) (shape (len(Re), 4, 4)) and
+        d state(day + 1) / d Re(day) (shape (len(Re), 4)).
+        """
+        states = np.empty((len(Re) + 1, 4))
+        d_state = np.zeros((len(Re), 4, 4))
+        d_Re = np.empty((len(Re), 4))
+
+        S, E, I, R = [float(item) for item in y_0]
+        states[0] = S, E, I, R
+
+        h = 1. / self.sub_steps
+        sigma, gamma, N = self.sigma, self.gamma, self.N
+
+        def tangent(S_s: float, I_s: float, dS: float, dE: float, dI: float, beta: float, d_beta: float) -> \
+                Tuple[float, float, float]:
+            # derivative of (dS, dE, dI) / dt along a tangent (dS, dE, dI), d_beta : derivative of beta.
+            d_infection = beta * (I_s * dS + S_s * dI) + d_beta * I_s * S_s
+            return -d_infection, d_infection - sigma * dE, sigma * dE - gamma * dI
+
+        for day, Re_day in enumerate(Re):
+            beta = float(Re_day) * gamma / N
+
+            # the tangents [dS, dE, dI, dR] of S, E, I (at the beginning of the day) and Re, as floats (much faster
+            # than small arrays). R has no effect on the other values : d state / d R is [0, 0, 0, 1].
+            list_tangents = [[1., 0., 0., 0.], [0., 1., 0., 0.], [0., 0., 1., 0.], [0., 0., 0., 0.]]
+            list_d_beta = [0., 0., 0., gamma / N]
+            for _ in range(self.sub_steps):
+                # the stages of the state (as integrate).
+                infection = beta * I * S
+                dS1, dE1, dI1 = -infection, infection - sigma * E, sigma * E - gamma * I
+                S2, E2, I2 = S + h / 2 * dS1, E + h / 2 * dE1, I + h / 2 * dI1
+                infection = beta * I2 * S2
+                dS2, dE2, dI2 = -infection, infection - sigma * E2, sigma * E2 - gamma * I2
+                S3, E3, I3 = S + h / 2 * dS2, E + h / 2 * dE2, I + h / 2 * dI2
+                infection = beta * I3 * S3
+                dS3, dE3, dI3 = -infection, infection - sigma * E3, sigma * E3 - gamma * I3
+                S4, E4, I4 = S + h * dS3, E + h * dE3, I + h * dI3
+                infection = beta * I4 * S4
+                dS4, dE4, dI4 = -infection, infection - sigma * E4, sigma * E4 - gamma * I4
+
+                # the same stages for each tangent.
+                for tangent_y, d_beta in zip(list_tangents, list_d_beta):
+                    tS, tE, tI, tR = tangent_y
+                    a1 = tangent(S, I, tS, tE, tI, beta, d_beta)
+                    a2 = tangent(S2, I2, tS + h / 2 * a1[0], tE + h / 2 * a1[1], tI + h / 2 * a1[2], beta, d_beta)
+                    a3 = tangent(S3, I3, tS + h / 2 * a2[0], tE + h / 2 * a2[1], tI + h / 2 * a2[2], beta, d_beta)
+                    a4 = tangent(S4, I4, tS + h * a3[0], tE + h * a3[1], tI + h * a3[2], beta, d_beta)
+                    tangent_y[3] = tR + h / 6 * gamma * (tI + 2 * (tI + h / 2 * a1[2]) + 2 * (tI + h / 2 * a2[2]) +
+                                                         tI + h * a3[2])
+                    tangent_y[0] = tS + h / 6 * (a1[0] + 2 * a2[0] + 2 * a3[0] + a4[0])
+                    tangent_y[1] = tE + h / 6 * (a1[1] + 2 * a2[1] + 2 * a3[1] + a4[1])
+                    tangent_y[2] = tI + h / 6 * (a1[2] + 2 * a2[2] + 2 * a3[2] + a4[2])
+
+                R = R + h / 6 * gamma * (I + 2 * I2 + 2 * I3 + I4)
+                S = S + h / 6 * (dS1 + 2 * dS2 + 2 * dS3 + dS4)
+                E = E + h / 6 * (dE1 + 2 * dE2 + 2 * dE3 + dE4)
+                I = I + h / 6 * (dI1 + 2 * dI2 + 2 * dI3 + dI4)
+
+            states[day + 1] = S, E, I, R
+            d_state[day, :, :3] = np.transpose(list_tangents[:3])
+            d_state[day, 3, 3] = 1.
+            d_Re[day] = list_tangents[3]
+
+        return states, d_state, d_Re
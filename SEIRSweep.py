@@ -0,0 +1,115 @@
+import argparse
+import csv
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from DataAccessObject import DataAccessObject
+from Enums import Country, PatientCase, PatientCategory
+from SEIR_model import SEIRModel
+
+# parameters of SEIRModel which can be swept (with the default values of SEIRModel).
+sweep_parameters: Dict[str, float] = {
+        'R0_0': 2.6,
+        'sigma': 1 / 5.2,
+        'gamma': 1 / 18,
+        'pc_hospitalized': 0.0046,
+        'E_0_factor': 7
+}
+
+output_header = ['run', 'country'] + list(sweep_parameters.keys()) + ['day', 'Re', 'I_model', 'I_reference']
+
+# reference data of the worker (set once per worker process, see _init_worker).
+_worker_hospitalization: Dict[Country, pd.DataFrame] = dict()
+
+
+def _init_worker(hospitalization: Dict[Country, pd.DataFrame]):
+    _worker_hospitalization.update(hospitalization)
+
+
+def _run_model(run: int, country: Country, parameters: Dict[str, float], model_options: Dict) -> List[List]:
+    """
+    Run one model in a worker process.
+    :return: the rows of the output (one per day).
+    """
+    model_options = dict(model_options)
+    method = model_options.pop('method', 'sweep')
+    model = SEIRModel(country, n_iter=model_options.pop('n_iter', 1), hospitalization=_worker_hospitalization[country],
+                      **parameters, **model_options)
+    sol_t, sol_y, sol_Re = model.run(method=method)
+
+    days = np.arange(len(sol_Re))
+    I_model = np.interp(days, sol_t, sol_y[2, :])
+
+    return [[run, country.name] + [parameters[name] for name in sweep_parameters.keys()] +
+            [day, sol_Re[day], I_model[day], model.I_curve[day]] for day in days]
+
+
+def run_sweep(countries: List[Country], grid: Dict[str, List[float]], output: str, workers: Optional[int] = None,
+              **model_options) -> int:
+    """
+    Run SEIRModel for every combination of the grid and every country, in parallel processes.
+    The data of each country are downloaded once (here), then sent once to each worker.
+    The rows are written to the output (csv) as soon as a model is done.
+    :param countries: the countries.
+    :param grid: for each parameter (see sweep_parameters), the values to test. Missing parameters take the default
+    value.
+    :param output: path of the csv file.
+    :param workers: number of processes [default = number of cpu].
+    :param model_options: other arguments of SEIRModel (engine, sub_steps, ...) or of SEIRModel.run (method) and
+    n_iter.
+    :return: the number of models run.
+    """
+    unknown = set(grid.keys()) - set(sweep_parameters.keys())
+    if unknown:
+        raise ValueError('parameters that can be swept : ' + str(list(sweep_parameters.keys())))
+
+    # one download for all the runs.
+    hospitalization = {country: DataAccessObject(country).get_data(PatientCase.hospitalization_daily_prevalence,
+                                                                   PatientCategory.country)['None']
+                       for country in countries}
+
+    names = list(sweep_parameters.keys())
+    values = [grid.get(name, [sweep_parameters[name]]) for name in names]
+    list_runs = [(country, dict(zip(names, combination)))
+                 for country in countries for combination in itertools.product(*values)]
+
+    with open(output, 'w', newline='') as output_file, \
+            ProcessPoolExecutor(max_workers=workers or os.cpu_count(), initializer=_init_worker,
+                                initargs=(hospitalization,)) as executor:
+        writer = csv.writer(output_file)
+        writer.writerow(output_header)
+
+        futures = [executor.submit(_run_model, run, country, parameters, model_options)
+                   for run, (country, parameters) in enumerate(list_runs)]
+        for future in as_completed(futures):
+            writer.writerows(future.result())
+            output_file.flush()
+
+    return len(list_runs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Run SEIRModel over a grid of parameters.')
+    parser.add_argument('--country', nargs='+', default=[Country.belgium.name],
+                        choices=[country.name for country in Country])
+    for parameter_name in sweep_parameters.keys():
+        parser.add_argument('--' + parameter_name, nargs='+', type=float)
+    parser.add_argument('--n_iter', type=int, default=1, help='back and forth of the sweep method.')
+    parser.add_argument('--method', default='sweep', choices=SEIRModel.methods)
+    parser.add_argument('--engine', default='scipy', choices=SEIRModel.engines)
+    parser.add_argument('--population_year', type=int, default=2016, help='year of the population.')
+    parser.add_argument('--workers', type=int, default=None, help='number of processes [default = cpu count].')
+    parser.add_argument('--output', default='sweep.csv', help='output csv file.')
+    args = parser.parse_args()
+
+    n_runs = run_sweep([Country[name] for name in args.country],
+                       {name: getattr(args, name) for name in sweep_parameters.keys()
+                        if getattr(args, name) is not None},
+                       args.output, args.workers, n_iter=args.n_iter, method=args.method, engine=args.engine,
+                       population_year=args.population_year)
+    print(str(n_runs) + ' runs written to ' + args.output)
@@ -1,12 +1,49 @@
-from typing import List
+import logging
+import time
+from typing import Callable, List, Optional, Tuple
 
+import Instrumentation
 from DataAccessObject import DataAccessObject
 from Enums import Country, PatientCase, PatientCategory
+from Population import get_population
+from SEIRIntegrator import SEIRIntegrator
+from Transform import Pipeline, RollingMean, Scale, Threshold
 import pandas as pd
-from scipy.integrate import solve_ivp as sol
-from scipy.optimize import minimize_scalar
 import numpy as np
 
+# scipy is imported by the methods using it (the 'rk4' engine does not need solve_ivp).
+
+logger = logging.getLogger(__name__)
+
+
+class FitStatistics:
+    """
+    Instrumentation of SEIRModel.run : it is given to the callback of run after each sweep (see SEIRModel.run).
+    """
+
+    def __init__(self, method: str):
+        # the fitting method ('sweep' or 'least_squares').
+        self.method: str = method
+
+        # number of sweeps done (least_squares : 1 at the end of the fit).
+        self.sweep: int = 0
+
+        # number of evaluations of the right hand side of the equations (one trajectory).
+        self.rhs_evaluations: int = 0
+
+        # number of evaluations of the cost (one trajectory).
+        self.cost_evaluations: int = 0
+
+        # number of iterations of the optimizers.
+        self.optimizer_iterations: int = 0
+
+        # duration [s] of each sweep.
+        self.sweep_times: List[float] = list()
+
+        # cost after each sweep.
+        self.costs: List[float] = list()
+
+
 class SEIRModel:
     """
     Model references :
@@ -48,27 +85,56 @@ class SEIRModel:
 
     """
 
-    def __init__(self, country: Country, R0_0 :float, n_iter):
+    engines = ('scipy', 'rk4')
+    methods = ('sweep', 'least_squares')
+
+    def __init__(self, country: Country, R0_0 :float, n_iter, engine: str = 'scipy', sub_steps: int = 4,
+                 sigma: float = 1/5.2, gamma: float = 1/18,
+                 pc_hospitalized: float = 0.0046, E_0_factor: float = 7,
+                 hospitalization: Optional[pd.DataFrame] = None, population_year: Optional[int] = 2016):
         """
 
         :param country: the country
         :param R0_0: the initial R0 for the optimization procedure.
+        :param n_iter: number of back and forth in the optimization procedure.
+        :param engine: 'scipy' (solve_ivp) or 'rk4' (fixed step, see SEIRIntegrator) [default = 'scipy'].
+        :param sub_steps: number of steps per day of the 'rk4' engine [default = 4].
+        :param sigma: infection rate (inverse of the mean latent period) [/day] [default = 1/5.2].
+        :param gamma: recovery rate (inverse of the infectious period) [/day] [default = 1/18].
+        :param pc_hospitalized: proportion of hospitalized patients in the I phase [default = 0.0046].
+        :param E_0_factor: E_0 = E_0_factor * I_0 [default = 7].
+        :param hospitalization: the daily prevalence of hospitalization for the country (see
+        DataAccessObject.get_data). If None, the data are downloaded [default = None].
+        :param population_year: the year of the population (None : the last year known) [default = 2016].
         """
+        if engine not in SEIRModel.engines:
+            raise ValueError('engine must be one of ' + str(SEIRModel.engines))
 
         # get population for current country
         self.R0_0 = R0_0
-        self.N = self.get_population(country)
+        self.N = self.get_population(country, population_year)
 
-        self.sigma = 1/5.2
-        self.gamma = 1/18
-        self.pc_hospitalized = 0.0046 # percentage of hospitalized patient in the I phase. TODO: 0.046
+        self.sigma = sigma
+        self.gamma = gamma
+        self.pc_hospitalized = pc_hospitalized # percentage of hospitalized patient in the I phase. TODO: 0.046
+
+        # ode solver
+        self.engine = engine
+        self.integrator = SEIRIntegrator(self.sigma, self.gamma, self.N, sub_steps)
 
         # data access object
-        self.dao = DataAccessObject(country)
-        self.I_curve = self._get_reference_curve(self.dao).to_numpy()
+        if hospitalization is None:
+            self.dao = DataAccessObject(country)
+            hospitalization = self.dao.get_data(PatientCase.hospitalization_daily_prevalence,
+                                                PatientCategory.country)['None']
+        else:
+            self.dao = None
+        reference_curve = self._get_reference_curve(hospitalization, country)
+        self.I_curve = reference_curve.to_numpy()
+        self.dates = reference_curve.index
 
         # initial condition
-        self.E_0 = 7 * self.I_curve[0] # TODO : changed this.
+        self.E_0 = E_0_factor * self.I_curve[0] # TODO : changed this.
         self.I_0 = self.I_curve[0]
         self.R_0 = 0
         self.S_0 = self.N - self.E_0 - self.I_0
@@ -83,74 +149,296 @@ class SEIRModel:
         # this vector contains the Re(t). It will be updated by a backward forward procedure.
         self.Re_store = np.ones(self.data_len - 1) * R0_0
 
+        # state [S, E, I, R] at the beginning of each day for the current Re_store (see _update_checkpoints).
+        # Only the days up to checkpoint_valid are up to date.
+        self.checkpoints = np.zeros((self.data_len, 4))
+        self.checkpoints[0, :] = self.i_c
+        self.checkpoint_valid = 0
+
+        # instrumentation of the last call to run.
+        self.statistics = FitStatistics('sweep')
+
     @staticmethod
-    def get_population(country: Country) -> int:
-        year = '2016'
-        population_df: pd.DataFrame = pd.read_csv('data/population_by_country_world_bank.csv')
-        return int(population_df[population_df['Country Name'] == country.name.capitalize()][year].iloc[0])
+    def get_population(country: Country, year: Optional[int] = 2016) -> int:
+        return get_population(country, year)
 
-    def run(self):
+    @Instrumentation.timed('model.run')
+    def run(self, method: str = 'sweep', smoothing: float = 0.,
+            callback: Optional[Callable[[FitStatistics], None]] = None, first_day: int = 0):
+        """
+        Fit Re(t) on the reference curve, then integrate the whole period.
+        :param method: 'sweep' (back and forth, Re optimized day by day) or 'least_squares' (all the Re at once,
+        see _fit_least_squares) [default = 'sweep'].
+        :param smoothing: weight of the square differences between consecutive Re ('least_squares' only)
+        [default = 0.].
+        :param callback: function called after each sweep with the statistics of the fit (also available in
+        self.statistics) [default = None].
+        :param first_day: Re is only fitted from this day, the Re before are kept (e.g. after load_state)
+        [default = 0 : all the days].
+        :return: the times, the states [S, E, I, R] and Re for each day.
+        """
+        if method not in SEIRModel.methods:
+            raise ValueError('method must be one of ' + str(SEIRModel.methods))
+        if not 0 <= first_day < self.data_len - 1:
+            raise ValueError('first_day must be between 0 and ' + str(self.data_len - 2))
+
+        self.statistics = FitStatistics(method)
+
+        if method == 'least_squares':
+            start = time.perf_counter()
+            self._fit_least_squares(smoothing, first_day)
+            self._end_sweep(start, callback)
+            sol_t, sol_y = self._solve()
+            return sol_t, sol_y, self.Re_store
 
         for index_bf in range(self.back_and_forth):
+            start = time.perf_counter()
 
             # loop for day to day
-            for day_n in list(range(self.data_len-1)) + list(range(self.data_len-3, -1, -1)):
+            for day_n in list(range(first_day, self.data_len-1)) + list(range(self.data_len-3, first_day - 1, -1)):
 
                 # optimize R0 for day_n -> day_n + 1
                 new_R0 = self._optimize([self.S_0, self.E_0, self.I_0, self.R_0], day_n)
                 self.Re_store[day_n] = new_R0
 
-        solution = self._solve()
+                # the state after day_n depends on the new value.
+                self.checkpoint_valid = min(self.checkpoint_valid, day_n)
+
+            self._end_sweep(start, callback)
+
+        sol_t, sol_y = self._solve()
+
+        return sol_t, sol_y, self.Re_store
+
+    def save_state(self, path: str):
+        """
+        Save the fit (Re, initial condition, checkpoints) to resume it later (see load_state).
+        :param path: the file (.npz).
+        :return:
+        """
+        np.savez(path, Re_store=self.Re_store, i_c=np.array(self.i_c), I_curve=self.I_curve,
+                 checkpoints=self.checkpoints[:self.checkpoint_valid + 1],
+                 first_date=np.array(self.dates[0], dtype='datetime64[ns]'),
+                 parameters=self._get_state_parameters(), engine=self.engine)
+
+    def load_state(self, path: str, window: int = 14) -> int:
+        """
+        Start the fit from a saved one (see save_state), typically fitted the day before : the Re and the
+        checkpoints are kept up to the first day of the reference curve which changed (or the first new day) minus
+        window days. The new days start with the last Re saved.
+        If the saved fit does not match the model (other parameters, other first day), it is not used.
+        :param path: the file (.npz).
+        :param window: number of days fitted again before the first change (the last days of the data are often
+        corrected) [default = 14].
+        :return: the first day to fit (see run first_day), 0 if the saved fit is not used.
+        """
+        with np.load(path, allow_pickle=False) as state:
+            if not np.allclose(state['parameters'], self._get_state_parameters(), rtol=1e-12) or \
+                    state['first_date'] != np.datetime64(self.dates[0], 'ns') or len(state['I_curve']) < 2:
+                logger.warning('saved fit %s does not match the model : full fit', path)
+                return 0
+
+            # first day of the reference curve which changed.
+            n_days = min(len(state['I_curve']), self.data_len)
+            changed = np.flatnonzero(~np.isclose(state['I_curve'][:n_days], self.I_curve[:n_days], rtol=1e-9))
+            first_changed = int(changed[0]) if len(changed) > 0 else n_days
+            first_day = min(max(first_changed - window, 0), self.data_len - 2)
+
+            Re_store = state['Re_store']
+            self.Re_store[:min(len(Re_store), len(self.Re_store))] = Re_store[:len(self.Re_store)]
+            self.Re_store[len(Re_store):] = Re_store[-1]
+
+            # the checkpoints are valid as long as Re and the integration are the same.
+            self.checkpoint_valid = 0
+            if str(state['engine']) == self.engine:
+                checkpoints = state['checkpoints'][:first_day + 1]
+                self.checkpoints[:len(checkpoints)] = checkpoints
+                self.checkpoint_valid = len(checkpoints) - 1
+
+        logger.info('saved fit %s loaded : fit from the day %d (%d new days)', path, first_day,
+                    max(self.data_len - len(Re_store) - 1, 0))
+        return first_day
+
+    def _get_state_parameters(self) -> np.ndarray:
+        """
+        :return: the parameters which must be the same to resume a fit (see load_state).
+        """
+        return np.array([self.N, self.sigma, self.gamma, self.pc_hospitalized, self.integrator.sub_steps] +
+                        list(self.i_c))
+
+    def _end_sweep(self, start: float, callback: Optional[Callable[[FitStatistics], None]]):
+        """
+        Update the statistics at the end of a sweep and give them to the callback.
+        :param start: time (time.perf_counter) of the beginning of the sweep.
+        :param callback: see run.
+        :return:
+        """
+        self._update_checkpoints(self.data_len - 1)
+
+        self.statistics.sweep += 1
+        self.statistics.sweep_times.append(time.perf_counter() - start)
+        self.statistics.costs.append(self._square_diff_reference(self.checkpoints[:, 2]))
+        logger.info('sweep %d : cost = %g, %.3f s', self.statistics.sweep, self.statistics.costs[-1],
+                    self.statistics.sweep_times[-1])
 
-        return solution.t, solution.y, self.Re_store
+        if callback is not None:
+            callback(self.statistics)
+
+    @Instrumentation.timed('model.least_squares')
+    def _fit_least_squares(self, smoothing: float = 0., first_day: int = 0, bounds: Tuple[float, float] = (0, 5)):
+        """
+        Fit all the Re at once with scipy.optimize.least_squares (starting from the current Re_store).
+        The residuals are the differences with the reference curve and, if smoothing > 0, the weighted
+        differences between consecutive Re. The jacobian is computed with the sensitivities of the rk4
+        integrator (see SEIRIntegrator.integrate_sensitivity), only when the optimizer asks for it.
+        :param smoothing: weight of the square differences between consecutive Re.
+        :param first_day: only the Re from this day are fitted (the integration starts from its checkpoint).
+        :param bounds: the bounds of Re.
+        :return:
+        """
+        n_Re = self.data_len - 1 - first_day
+        weight = np.sqrt(smoothing)
+
+        self._update_checkpoints(first_day)
+        y_0 = self.checkpoints[first_day, :]
+        I_curve = self.I_curve[first_day:]
+
+        def residuals(Re: np.ndarray) -> np.ndarray:
+            # the sensitivities are only needed for the jacobian (not for the trial steps of the optimizer).
+            states = self.integrator.integrate(y_0, Re)
+            self.statistics.rhs_evaluations += 4 * self.integrator.sub_steps * n_Re
+            self.statistics.cost_evaluations += 1
+
+            res = states[:, 2] - I_curve
+            if smoothing > 0:
+                res = np.concatenate((res, weight * np.diff(Re)))
+            return res
+
+        def jacobian(Re: np.ndarray) -> np.ndarray:
+            _, d_state, d_Re = self.integrator.integrate_sensitivity(y_0, Re)
+            self.statistics.rhs_evaluations += 4 * self.integrator.sub_steps * n_Re
+
+            # d I(day) / d Re(k) : the effect of Re(k) at the end of the day k is propagated day by day.
+            jac = np.zeros((len(I_curve), n_Re))
+            sensitivity = np.zeros((4, n_Re))
+            for day in range(n_Re):
+                sensitivity = d_state[day] @ sensitivity
+                sensitivity[:, day] = d_Re[day]
+                jac[day + 1, :] = sensitivity[2, :]
+
+            if smoothing > 0:
+                jac = np.vstack((jac, weight * (np.eye(n_Re, k=1) - np.eye(n_Re))[:-1, :]))
+            return jac
+
+        from scipy.optimize import least_squares
+
+        result = least_squares(residuals, np.clip(self.Re_store[first_day:], *bounds), jac=jacobian, bounds=bounds,
+                               x_scale='jac')
+        self.statistics.optimizer_iterations += result.nfev
+
+        self.Re_store[first_day:] = result.x
+        self.checkpoint_valid = first_day
 
     def _optimize(self, i_c: List, index) -> float:
-        print('---------------------------')
-        print('index loop : ' + str(index))
+        from scipy.optimize import minimize_scalar
         res = minimize_scalar(self._cost_function, bounds=[0, 5], args=(index, ), method='Bounded')
-        print('Re current = ' + str(res.x))
-        return res.x
+        self.statistics.optimizer_iterations += res.nit
+        res_x = res.x
+        logger.debug('index loop : %d, Re current = %g', index, res_x)
+        return res_x
 
+    @Instrumentation.timed('model.cost_function')
     def _cost_function(self, R0, index) -> float:
-
-        solution = sol(
-                self._dydt,
-                [0, self.data_len - 1],
-                self.i_c,
-                t_eval=list(range(0, self.data_len)),
-                max_step=0.5,
-                args=(R0, index)
-        )
-        cost = self._square_diff_reference(solution.y[2, :])
-        # print('square diff = ' + str(cost))
+        """
+        Square difference with the reference when Re = R0 for the day index.
+        The days before index do not depend on R0 : the integration starts from the checkpoint of the day index.
+        :param R0: the value tested for Re(index).
+        :param index: the day being optimized.
+        :return: the cost.
+        """
+        self._update_checkpoints(index)
+
+        if self.engine == 'rk4':
+            Re = [R0] + self.Re_store[index + 1:].tolist()
+            I_signal = self._integrate(self.checkpoints[index, :], Re)[:, 2]
+        else:
+            from scipy.integrate import solve_ivp as sol
+            solution = sol(
+                    self._dydt,
+                    [index, self.data_len - 1],
+                    self.checkpoints[index, :],
+                    t_eval=list(range(index, self.data_len)),
+                    max_step=0.5,
+                    args=(R0, index)
+            )
+            I_signal = solution.y[2, :]
+
+        cost = self._square_diff_reference(np.concatenate((self.checkpoints[:index, 2], I_signal)))
+        self.statistics.cost_evaluations += 1
         return cost
 
+    def _update_checkpoints(self, index):
+        """
+        Integrate the current Re_store from the last valid checkpoint up to the day index (if needed).
+        :param index: the last day for which the checkpoint must be valid.
+        :return:
+        """
+        if index <= self.checkpoint_valid:
+            return
+
+        if self.engine == 'rk4':
+            states = self._integrate(self.checkpoints[self.checkpoint_valid, :],
+                                     self.Re_store[self.checkpoint_valid:index])
+        else:
+            from scipy.integrate import solve_ivp as sol
+            states = sol(
+                    self._dydt,
+                    [self.checkpoint_valid, index],
+                    self.checkpoints[self.checkpoint_valid, :],
+                    t_eval=list(range(self.checkpoint_valid, index + 1)),
+                    max_step=0.5
+            ).y.T
+
+        self.checkpoints[self.checkpoint_valid:index + 1, :] = states
+        self.checkpoint_valid = index
+
     def _square_diff_reference(self, signal_1: np.ndarray) -> float:
         return float(np.sum(np.square(self.I_curve - signal_1)))
 
-    def _solve(self):
+    @Instrumentation.timed('model.solve')
+    def _solve(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Integrate the whole period with the current Re_store.
+        :return: the times and the states [S, E, I, R] (shape (4, len(times))).
+        """
+        if self.engine == 'rk4':
+            states = self._integrate(self.i_c, self.Re_store[:-1])
+            return np.arange(self.data_len - 1, dtype=float), states.T
 
+        from scipy.integrate import solve_ivp as sol
         solution = sol(
                 self._dydt,
                 [0, self.data_len - 2],
                 self.i_c,
                 max_step=0.1
         )
-        return solution
+        return solution.t, solution.y
+
+    def _integrate(self, y_0, Re) -> np.ndarray:
+        """
+        Integrate with the rk4 engine (see SEIRIntegrator.integrate) and count the evaluations.
+        """
+        self.statistics.rhs_evaluations += 4 * self.integrator.sub_steps * len(Re)
+        return self.integrator.integrate(y_0, Re)
 
     def _dydt(self, t, y, R0=0, index=-1):
+        self.statistics.rhs_evaluations += 1
 
         # find the index for the current time
-        current_index = int(np.floor(t)) if t < self.data_len - 1 else self.data_len - 2
+        current_index = int(t) if t < self.data_len - 1 else self.data_len - 2
 
-        # recompute all Re
-        Re_temp = self.Re_store
-
-        # change the value being optimized with the injected value (R0)
-        if index > -1:
-            Re_temp[index] = R0
-
-        R_current = Re_temp[current_index]
+        # the value being optimized is replaced by the injected value (R0), Re_store is not modified.
+        R_current = R0 if current_index == index else self.Re_store[current_index]
 
         S, E, I, R = y
 
@@ -163,20 +451,13 @@ class SEIRModel:
 
         return [dS, dE, dI, dR]
 
-    def _get_reference_curve(self, dao) -> pd.DataFrame:
-        I_reference = self.dao.get_data(
-                PatientCase.hospitalization_daily_prevalence,
-                PatientCategory.country)['None']
-
-        # only select over 10 hospitalization
-        I_reference = I_reference[I_reference[PatientCategory.total.name] > 10]
-
-        # we must divide by the proportion of people infectious which must go to hospitalization.
-        I_reference[PatientCategory.total.name] = I_reference[PatientCategory.total.name] / self.pc_hospitalized
-
-        # smoooth
-        I_reference = I_reference.rolling(7, min_periods=1).mean()
-
-        return I_reference[PatientCategory.total.name]
-
+    def get_reference_pipeline(self) -> Pipeline:
+        """
+        :return: the transforms of the hospitalizations giving the infectious people (see _get_reference_curve).
+        """
+        # only select over 10 hospitalization, we must divide by the proportion of people infectious which must go to
+        # hospitalization, then smooth.
+        return Pipeline(Threshold(10), Scale(1 / self.pc_hospitalized), RollingMean(7))
 
+    def _get_reference_curve(self, hospitalization: pd.DataFrame, country: Country) -> pd.Series:
+        return self.get_reference_pipeline().apply(hospitalization, country)[PatientCategory.total.name]
@@ -0,0 +1,340 @@
+"""
+Transforms of the aggregates (dates x values of a category, see DataAccessObject.get_aggregate), declared once and
+evaluated when the data are asked for :
+
+    pipeline = Pipeline(RollingMean(7), PerCapita())
+    dao.get_transformed(PatientCase.positive_to_covid_daily, PatientCategory.geo_level_3, pipeline)
+
+Each step works on the whole matrix dates x series at once (one numpy operation for all the values of the category).
+The pipelines are hashable (see Pipeline.key) : the data access object keeps the result of each pipeline.
+"""
+from typing import Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from Enums import Country, PatientCategory
+from Population import get_population
+
+# label of the only series of the aggregate of the whole country (see DataAccessObject.get_aggregate).
+country_label = 'None'
+
+
+def _rolling_sum(values: np.ndarray, window: int, min_periods: int) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Sum of the last window rows of each column (the NaN are skipped).
+    :return: the sums (NaN when less than min_periods values are known) and the number of values of each sum.
+    """
+    valid = ~np.isnan(values)
+    zeros = np.zeros((1, values.shape[1]))
+    sums = np.concatenate((zeros, np.cumsum(np.where(valid, values, 0.), axis=0)))
+    counts = np.concatenate((zeros, np.cumsum(valid, axis=0)))
+
+    # the cumulative sums of row t + 1 minus the ones of the first row of the window.
+    first = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+    window_sums = sums[1:] - sums[first]
+    window_counts = counts[1:] - counts[first]
+    return np.where(window_counts >= min_periods, window_sums, np.nan), window_counts
+
+
+def _get_ratio(values: np.ndarray, window: int) -> np.ndarray:
+    """
+    :return: value of each row divided by the one window rows before (NaN when not defined).
+    """
+    ratio = np.full(values.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio[window:] = values[window:] / values[:-window]
+    ratio[~np.isfinite(ratio) | (ratio <= 0)] = np.nan
+    return ratio
+
+
+class Step:
+    """
+    One step of a Pipeline. The parameters (params) identify the step (see key).
+    """
+    # name of the step in the spec of a pipeline (see Pipeline.parse).
+    name: str = ''
+
+    def __init__(self, *params):
+        self.params = params
+
+    @property
+    def key(self) -> Tuple:
+        return (type(self).__name__,) + self.params
+
+    @property
+    def get_clean_str(self) -> str:
+        return self.name.replace('_', ' ')
+
+    def apply(self, values: np.ndarray, dates: pd.DatetimeIndex, columns: List[str], country: Country) -> \
+            Tuple[np.ndarray, pd.DatetimeIndex]:
+        """
+        :param values: the matrix dates x series (not modified).
+        :param dates: the dates (rows of values).
+        :param columns: the labels of the series (columns of values).
+        :param country: the country of the data.
+        :return: the new values and their dates.
+        """
+        raise NotImplementedError
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Step) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return type(self).__name__ + '(' + ', '.join(repr(param) for param in self.params) + ')'
+
+
+class RollingMean(Step):
+    """
+    Mean of the last window days (e.g. 7 : the weekly effect is removed).
+    """
+    name = 'rolling_mean'
+
+    def __init__(self, window: int = 7, min_periods: int = 1):
+        if window < 1 or min_periods < 1:
+            raise ValueError('window and min_periods must be at least 1')
+        super().__init__(window, min_periods)
+
+    @property
+    def get_clean_str(self) -> str:
+        return str(self.params[0]) + '-day mean'
+
+    def apply(self, values, dates, columns, country):
+        sums, counts = _rolling_sum(values, *self.params)
+        with np.errstate(invalid='ignore'):
+            return sums / counts, dates
+
+
+class RollingSum(Step):
+    """
+    Sum of the last window days (e.g. 14 : the cases of the last two weeks).
+    """
+    name = 'rolling_sum'
+
+    def __init__(self, window: int = 7, min_periods: int = 1):
+        if window < 1 or min_periods < 1:
+            raise ValueError('window and min_periods must be at least 1')
+        super().__init__(window, min_periods)
+
+    @property
+    def get_clean_str(self) -> str:
+        return str(self.params[0]) + '-day sum'
+
+    def apply(self, values, dates, columns, country):
+        return _rolling_sum(values, *self.params)[0], dates
+
+
+class Scale(Step):
+    """
+    Multiply by a factor (e.g. 1 / proportion of the infectious people which go to hospital, see SEIRModel).
+    """
+    name = 'scale'
+
+    def __init__(self, factor: float):
+        super().__init__(float(factor))
+
+    @property
+    def get_clean_str(self) -> str:
+        return 'x ' + '%g' % self.params[0]
+
+    def apply(self, values, dates, columns, country):
+        return values * self.params[0], dates
+
+
+class PerCapita(Step):
+    """
+    Values for per inhabitants (e.g. per 100000). The population table only knows the countries : the series of the
+    whole country (see country_label) is divided by the population of the country, the other series (regions, age,
+    ...) need their population in dic_population (a ValueError is raised otherwise, see is_available).
+    """
+    name = 'per_capita'
+
+    def __init__(self, per: float = 100000, year: Optional[int] = None,
+                 dic_population: Optional[Dict[str, float]] = None):
+        """
+
+        :param per: number of inhabitants [default = 100000].
+        :param year: the year of the population of the country [default = None : the last year known].
+        :param dic_population: population of the other series, label -> population [default = None : none].
+        """
+        super().__init__(float(per), year, tuple(sorted((dic_population or dict()).items())))
+
+    @property
+    def get_clean_str(self) -> str:
+        per = self.params[0]
+        return 'per ' + ('%gk' % (per / 1000) if per >= 1000 and per % 1000 == 0 else '%g' % per)
+
+    def is_available(self, category: PatientCategory) -> bool:
+        """
+        :return: True if the population of the series of the category may be known (the country, or dic_population).
+        """
+        return category == PatientCategory.country or len(self.params[2]) > 0
+
+    def apply(self, values, dates, columns, country):
+        per, year, population_items = self.params
+        dic_population = dict(population_items)
+
+        missing = [label for label in columns if label not in dic_population and label != country_label]
+        if missing:
+            raise ValueError('no population for ' + ', '.join(str(label) for label in missing[:5]) +
+                             (' ...' if len(missing) > 5 else '') + ' (only the population of the country is known)')
+        if country_label in columns and country_label not in dic_population:
+            dic_population[country_label] = get_population(country, year)
+
+        return values * (per / np.array([dic_population[label] for label in columns], float)), dates
+
+
+class Threshold(Step):
+    """
+    Only the values over minimum are kept : the days on which no series is over minimum are removed, the other values
+    under minimum are NaN (e.g. the first days of the epidemic, too noisy for the model).
+    """
+    name = 'threshold'
+
+    def __init__(self, minimum: float):
+        super().__init__(float(minimum))
+
+    @property
+    def get_clean_str(self) -> str:
+        return 'over ' + '%g' % self.params[0]
+
+    def apply(self, values, dates, columns, country):
+        with np.errstate(invalid='ignore'):
+            over = values > self.params[0]
+        rows = over.any(axis=1)
+        return np.where(over, values, np.nan)[rows], dates[rows]
+
+
+class Log(Step):
+    """
+    Logarithm of the values (NaN when the value is not positive).
+    """
+    name = 'log'
+
+    def __init__(self, base: float = 10):
+        super().__init__(float(base))
+
+    @property
+    def get_clean_str(self) -> str:
+        return 'log' + '%g' % self.params[0]
+
+    def apply(self, values, dates, columns, country):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.where(values > 0, np.log(values) / np.log(self.params[0]), np.nan), dates
+
+
+class GrowthRate(Step):
+    """
+    Daily growth rate, from the ratio between each day and window days before (e.g. 0.05 : +5% a day).
+    """
+    name = 'growth_rate'
+
+    def __init__(self, window: int = 7):
+        if window < 1:
+            raise ValueError('window must be at least 1')
+        super().__init__(window)
+
+    def apply(self, values, dates, columns, country):
+        return _get_ratio(values, self.params[0]) ** (1 / self.params[0]) - 1, dates
+
+
+class DoublingTime(Step):
+    """
+    Number of days for the values to double, from the ratio between each day and window days before (negative : the
+    number of days to halve, NaN when the values do not change).
+    """
+    name = 'doubling_time'
+
+    def __init__(self, window: int = 7):
+        if window < 1:
+            raise ValueError('window must be at least 1')
+        super().__init__(window)
+
+    def apply(self, values, dates, columns, country):
+        with np.errstate(divide='ignore'):
+            doubling_time = self.params[0] * np.log(2) / np.log(_get_ratio(values, self.params[0]))
+        doubling_time[~np.isfinite(doubling_time)] = np.nan
+        return doubling_time, dates
+
+
+# name -> step (see Pipeline.parse).
+dic_steps: Dict[str, type] = {step.name: step for step in (RollingMean, RollingSum, Scale, PerCapita, Threshold, Log,
+                                                           GrowthRate, DoublingTime)}
+
+
+class Pipeline:
+    """
+    Steps applied one after the other to an aggregate. Nothing is computed when the pipeline is declared (see apply).
+    Two pipelines with the same steps are equal and have the same hash : they share their results.
+    """
+
+    def __init__(self, *steps: Step):
+        self.steps: Tuple[Step, ...] = steps
+
+    @property
+    def key(self) -> Tuple:
+        return tuple(step.key for step in self.steps)
+
+    @property
+    def get_clean_str(self) -> str:
+        return ', '.join(step.get_clean_str for step in self.steps)
+
+    def is_available(self, category: PatientCategory) -> bool:
+        """
+        :return: False if a step cannot be applied to the series of the category (see PerCapita.is_available).
+        """
+        return all(step.is_available(category) for step in self.steps if isinstance(step, PerCapita))
+
+    def then(self, *steps: Step) -> 'Pipeline':
+        """
+        :return: a new pipeline, with the steps after the ones of this pipeline.
+        """
+        return Pipeline(*(self.steps + steps))
+
+    def apply(self, aggregate: pd.DataFrame, country: Country) -> pd.DataFrame:
+        """
+        Apply the steps to all the columns at once.
+        :param aggregate: dates (index) x series (columns), see DataAccessObject.get_aggregate (not modified).
+        :param country: the country of the data (see PerCapita).
+        :return: the new table (same columns).
+        """
+        if len(self.steps) == 0:
+            return aggregate
+
+        values = aggregate.to_numpy(dtype='float64')
+        dates = aggregate.index
+        columns = aggregate.columns.tolist()
+        for step in self.steps:
+            values, dates = step.apply(values, dates, columns, country)
+
+        return pd.DataFrame(values, index=dates, columns=aggregate.columns, copy=False)
+
+    @staticmethod
+    def parse(spec: List[Union[str, List]]) -> 'Pipeline':
+        """
+        :param spec: the steps, each one a name or a list [name, parameters...], e.g. [["rolling_mean", 7],
+        "per_capita"] (see dic_steps).
+        :return: the pipeline.
+        """
+        list_steps = list()
+        for item in spec:
+            name, params = (item, []) if isinstance(item, str) else (item[0], item[1:])
+            if name not in dic_steps:
+                raise ValueError('unknown step ' + str(name) + ', must be one of ' + str(list(dic_steps.keys())))
+            list_steps.append(dic_steps[name](*params))
+        return Pipeline(*list_steps)
+
+    def __len__(self) -> int:
+        return len(self.steps)
+
+    def __eq__(self, other) -> bool:
+        return isinstance(other, Pipeline) and self.key == other.key
+
+    def __hash__(self) -> int:
+        return hash(self.key)
+
+    def __repr__(self) -> str:
+        return 'Pipeline(' + ', '.join(repr(step) for step in self.steps) + ')'
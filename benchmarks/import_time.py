@@ -0,0 +1,67 @@
+import argparse
+import os
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+# root of the repository (the modules are imported from there).
+root_directory = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# entry point -> (maximum import time [ms], modules it must not import).
+# The heavy modules are imported when they are used (e.g. when a country is selected in the GUI).
+entry_points: Dict[str, Tuple[float, List[str]]] = {
+        'GUI': (1000., ['pandas', 'requests', 'scipy', 'DataAccessObject', 'AxesPlotter']),
+        'Render': (1300., ['requests', 'scipy', 'PyQt5', 'PySide2', 'PyQt6', 'PySide6']),
+        'SEIR_model': (800., ['requests', 'scipy']),
+        'SEIRSweep': (800., ['requests', 'scipy']),
+        'DataAccessObject': (700., ['requests', 'scipy', 'matplotlib']),
+        'Downloader': (50., ['requests'])
+}
+
+
+def measure(module: str) -> Tuple[float, List[str]]:
+    """
+    Import the module in a new interpreter (python -X importtime).
+    :param module: the name of the module.
+    :return: the import time of the module [ms] and all the modules imported.
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import ' + module],
+                            cwd=root_directory, capture_output=True, text=True, check=True)
+
+    import_time = None
+    list_modules = list()
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or '|' not in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not cumulative.strip().isdigit():
+            continue
+        list_modules.append(name.strip())
+        if name.strip() == module:
+            import_time = int(cumulative) / 1000.
+
+    return import_time, list_modules
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Check the import time of the entry points.')
+    parser.add_argument('--repeat', type=int, default=3, help='the best of repeat imports is kept.')
+    args = parser.parse_args()
+
+    failed = False
+    for module, (budget, forbidden) in entry_points.items():
+        results = [measure(module) for _ in range(args.repeat)]
+        import_time = min(item[0] for item in results)
+        imported = set(results[0][1])
+
+        errors = list()
+        if import_time > budget:
+            errors.append('slower than %.0f ms' % budget)
+        errors += ['imports ' + name for name in forbidden
+                   if name in imported or any(item.startswith(name + '.') for item in imported)]
+
+        print('%-20s %8.1f ms  %s' % (module, import_time, ', '.join(errors) if errors else 'ok'))
+        failed = failed or len(errors) > 0
+
+    sys.exit(1 if failed else 0)
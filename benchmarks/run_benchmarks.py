@@ -0,0 +1,172 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import matplotlib
+
+# no window.
+matplotlib.use('Agg')
+
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
+
+import synthetic
+from AxesPlotter import AxesPlotter
+from DataAccessObject import DataAccessObject
+from DataCache import DataCache
+from Enums import Country, PatientCase, PatientCategory
+from SEIR_model import SEIRModel
+from Transform import PerCapita, Pipeline, RollingMean
+
+DEFAULT_THRESHOLDS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'thresholds.json')
+
+# the fit of the model takes too long on the biggest datasets : it is only run up to this scale (and the sweep only
+# on the first sweep_days days).
+max_scale_run = 1
+sweep_days = 60
+
+
+def measure(function: Callable[[], object], repeat: int) -> float:
+    """
+    :return: the best time [s] of repeat calls of the function.
+    """
+    list_times = list()
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        list_times.append(time.perf_counter() - start)
+    return min(list_times)
+
+
+def get_patterns(dao: DataAccessObject) -> List[Tuple[PatientCase, PatientCategory]]:
+    """
+    :return: all the (case, category) of the data access object.
+    """
+    return [(case, category) for case in dict.fromkeys(dao.get_cases_available())
+            for category in [PatientCategory.country] + dao.get_categories_available_for_case(case)]
+
+
+def benchmark_country(country: Country, scale: float, repeat: int) -> Dict[str, float]:
+    """
+    Run the benchmarks on the synthetic files of the country (served locally).
+    :return: the time [s] of each benchmark.
+    """
+    dic_times: Dict[str, float] = dict()
+    directory = tempfile.mkdtemp()
+    n_rows = synthetic.generate_country(country, scale, os.path.join(directory, 'files'))
+    server, base_url = synthetic.serve(os.path.join(directory, 'files'))
+
+    try:
+        list_file_info = synthetic.get_local_info(country, base_url)
+
+        # download and parse all the files, then load them from the cache.
+        dic_times['ingest'] = measure(lambda: DataAccessObject(country, list_file_info, use_cache=False).load(),
+                                      repeat)
+        cache = DataCache(os.path.join(directory, 'cache'), ttl=float('inf'))
+        DataAccessObject(country, list_file_info, cache=cache).load()
+        dic_times['ingest_cached'] = measure(lambda: DataAccessObject(country, list_file_info, cache=cache).load(),
+                                             repeat)
+        print('    %d rows, %.0f rows/s' % (n_rows, n_rows / dic_times['ingest']))
+
+        dao = DataAccessObject(country, list_file_info, cache=cache)
+        dao.load()
+        patterns = get_patterns(dao)
+
+        # all the aggregates (not memoized).
+        def get_all_data():
+            dao.dic_aggregate.clear()
+            for pattern in patterns:
+                dao.get_data(*pattern)
+        dic_times['get_data'] = measure(get_all_data, repeat)
+
+        # 7-day mean (per 100k inhabitants for the whole country) of all the aggregates (not memoized).
+        pipeline = Pipeline(RollingMean(7))
+
+        def transform_all():
+            dao.dic_transformed.clear()
+            for pattern in patterns:
+                dao.get_transformed(*pattern, pipeline.then(PerCapita()) if pattern[1] == PatientCategory.country
+                                    else pipeline)
+        dic_times['transform'] = measure(transform_all, repeat)
+
+        # one figure per (case, category), as in the GUI.
+        def plot_all():
+            for pattern in patterns:
+                fig = Figure(figsize=(10, 7))
+                FigureCanvasAgg(fig)
+                AxesPlotter(dao, level_of_detail=True, top_n=20).plot(fig.add_subplot(), pattern)
+                fig.canvas.draw()
+        dic_times['plot'] = measure(plot_all, repeat)
+
+        # model (only for the countries with the hospitalizations).
+        if PatientCase.hospitalization_daily_prevalence in dao.get_cases_available():
+            hospitalization = dao.get_data(PatientCase.hospitalization_daily_prevalence, PatientCategory.country)['None']
+            for engine in SEIRModel.engines:
+                model = SEIRModel(country, 2.6, 1, engine=engine, hospitalization=hospitalization)
+                index = model.data_len // 2
+
+                # the checkpoints up to index are integrated once (not timed) : each repeat measures the same work.
+                model._update_checkpoints(index)
+                dic_times['cost_function_' + engine] = measure(lambda: model._cost_function(1.2, index), repeat)
+
+            if scale <= max_scale_run:
+                dic_times['run_least_squares'] = measure(
+                        lambda: SEIRModel(country, 2.6, 1, engine='rk4', hospitalization=hospitalization).run(
+                                method='least_squares'), 1)
+                dic_times['run_sweep'] = measure(
+                        lambda: SEIRModel(country, 2.6, 1, engine='rk4',
+                                          hospitalization=hospitalization.iloc[:sweep_days]).run(), 1)
+    finally:
+        server.shutdown()
+
+    return dic_times
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmarks on synthetic data (no network access). '
+                                                 'Exit code 1 if a benchmark is slower than its threshold.')
+    parser.add_argument('--country', nargs='+', default=[country.name for country in Country],
+                        choices=[country.name for country in Country])
+    parser.add_argument('--scale', nargs='+', type=float, default=[1, 10],
+                        help='size of the datasets compared to the real ones (e.g. 1 10 100).')
+    parser.add_argument('--repeat', type=int, default=3, help='the best of repeat runs is kept.')
+    parser.add_argument('--thresholds', default=DEFAULT_THRESHOLDS, help='json file of the reference times.')
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='allowed slowdown compared to the reference times [default = 0.3 : 30%%].')
+    parser.add_argument('--save', action='store_true', help='save the times as the new reference times.')
+    args = parser.parse_args()
+
+    dic_reference: Dict[str, float] = dict()
+    if os.path.exists(args.thresholds):
+        with open(args.thresholds) as thresholds_file:
+            dic_reference = json.load(thresholds_file)
+
+    dic_results: Dict[str, float] = dict()
+    failed = False
+    for name in args.country:
+        for scale in args.scale:
+            print('%s x%g' % (name, scale))
+            for benchmark, duration in benchmark_country(Country[name], scale, args.repeat).items():
+                key = '%s-x%g-%s' % (name, scale, benchmark)
+                dic_results[key] = duration
+
+                status = 'no reference'
+                if key in dic_reference:
+                    ratio = duration / dic_reference[key]
+                    status = '%+.0f%%' % (100 * (ratio - 1))
+                    if ratio > 1 + args.tolerance:
+                        status += ' REGRESSION'
+                        failed = True
+                print('    %-24s %9.4f s  %s' % (benchmark, duration, status))
+
+    if args.save:
+        dic_reference.update(dic_results)
+        with open(args.thresholds, 'w') as thresholds_file:
+            json.dump(dic_reference, thresholds_file, indent=4, sort_keys=True)
+        print('reference times saved to ' + args.thresholds)
+    else:
+        sys.exit(1 if failed else 0)
@@ -0,0 +1,220 @@
+import email.utils
+import functools
+import http
+import http.server
+import os
+import sys
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+# the modules of the repository.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from DataSource import DataSource, FileInformation
+from Enums import Country, PatientCategory
+
+# number of days of a file at scale 1 (about the size of the real files).
+days_per_scale = 200
+
+# number of values of each category, the geographic levels being nested (level 3 -> level 2 -> level 1).
+dic_cardinality: Dict[Country, Dict[PatientCategory, int]] = {
+        Country.belgium: {
+                PatientCategory.geo_level_1: 3,
+                PatientCategory.geo_level_2: 11,
+                PatientCategory.geo_level_3: 581,
+                PatientCategory.age: 10,
+                PatientCategory.sex: 2
+        },
+        Country.france: {
+                PatientCategory.geo_level_1: 101,
+                PatientCategory.age: 11,
+                PatientCategory.sex: 3
+        }
+}
+
+# some real values (with non ascii characters, as in the real files).
+dic_names: Dict[Tuple[Country, PatientCategory], List[str]] = {
+        (Country.belgium, PatientCategory.geo_level_1): ['Brussels', 'Flanders', 'Wallonia'],
+        (Country.belgium, PatientCategory.geo_level_2): ['Antwerpen', 'BrabantWallon', 'Brussels', 'Hainaut',
+                                                         'Limburg', 'Liège', 'Luxembourg', 'Namur', 'OostVlaanderen',
+                                                         'VlaamsBrabant', 'WestVlaanderen'],
+        (Country.belgium, PatientCategory.sex): ['F', 'M']
+}
+
+geo_levels = [PatientCategory.geo_level_3, PatientCategory.geo_level_2, PatientCategory.geo_level_1]
+
+
+def get_values(country: Country, category: PatientCategory) -> List[str]:
+    """
+    :return: the values of the category in the synthetic files.
+    """
+    names = dic_names.get((country, category))
+    if names is not None:
+        return names
+    return [category.name + '_' + str(index) for index in range(dic_cardinality[country][category])]
+
+
+def get_files(country: Country) -> Dict[str, List[FileInformation]]:
+    """
+    :return: the FileInformation of the country grouped by file.
+    """
+    dic_files: Dict[str, List[FileInformation]] = dict()
+    for item in DataSource.get_info_for_country(country):
+        dic_files.setdefault(item.http_file, list()).append(item)
+    return dic_files
+
+
+def get_file_name(url: str) -> str:
+    return url.rsplit('/', 1)[1]
+
+
+def generate_file(country: Country, list_file_info: List[FileInformation], scale: float, path: str,
+                  seed: int = 0) -> int:
+    """
+    Write a csv file with the headers of the FileInformation (of the same file) : one row per day and per
+    combination of the categories of the file. The totals follow epidemic waves.
+    :param country: the country (separator, encoding, date format).
+    :param list_file_info: the FileInformation of the file.
+    :param scale: size of the file compared to the real one (number of days).
+    :param path: the file written.
+    :param seed: seed of the random values.
+    :return: the number of rows.
+    """
+    rng = np.random.default_rng(seed)
+    dic_category = list_file_info[0].dic_category
+    categories = [category for category in dic_category.keys()
+                  if category not in (PatientCategory.date, PatientCategory.total)]
+    totals = list(dict.fromkeys(item.dic_category[PatientCategory.total] for item in list_file_info))
+    na_values = [value for item in list_file_info for value in item.na_values]
+
+    # the finest geographic level gives the other ones (level 3 -> level 2 -> level 1).
+    finest = [level for level in geo_levels if level in categories][:1]
+    others = [category for category in categories if category not in geo_levels]
+    axes = [np.arange(dic_cardinality[country][category]) for category in finest + others]
+    grid = np.stack(np.meshgrid(*axes, indexing='ij'), -1).reshape(-1, len(axes)) if axes else np.zeros((1, 0), int)
+
+    columns: Dict[str, np.ndarray] = dict()
+    for index, category in enumerate(finest + others):
+        codes = grid[:, index]
+        if category in geo_levels:
+            # the upper levels of the finest one.
+            for level in geo_levels[geo_levels.index(category):]:
+                if level in categories:
+                    columns[dic_category[level]] = np.array(get_values(country, level))[
+                            codes % dic_cardinality[country][level]]
+        else:
+            columns[dic_category[category]] = np.array(get_values(country, category))[codes]
+
+    n_days = max(int(days_per_scale * scale), 1)
+    weights = rng.uniform(0.2, 1.5, len(grid))
+    dates = pd.date_range('2020-03-01', periods=n_days).strftime(country.date_format)
+
+    # a few days at a time (the biggest files do not fit in memory).
+    with open(path, 'w', encoding=country.encoding, newline='') as csv_file:
+        header = [dic_category[PatientCategory.date]] + list(columns.keys()) + totals
+        csv_file.write(country.sep.join(header) + '\n')
+
+        days_per_chunk = max(200000 // len(grid), 1)
+        for first_day in range(0, n_days, days_per_chunk):
+            days = np.arange(first_day, min(first_day + days_per_chunk, n_days))
+            chunk = {dic_category[PatientCategory.date]: np.repeat(dates[days], len(grid))}
+            chunk.update({name: np.tile(values, len(days)) for name, values in columns.items()})
+            for index, name in enumerate(totals):
+                wave = 30 * (1.1 + np.sin(2 * np.pi * days / 150 + index))
+                values = rng.poisson(np.outer(wave, weights).ravel()).astype(object)
+                if na_values:
+                    values[values < 5] = na_values[0]
+                chunk[name] = values
+            pd.DataFrame(chunk).to_csv(csv_file, sep=country.sep, header=False, index=False)
+
+    return n_days * len(grid)
+
+
+def generate_country(country: Country, scale: float, directory: str) -> int:
+    """
+    Write the synthetic files of the country (named as the real ones).
+    :return: the number of rows written.
+    """
+    os.makedirs(directory, exist_ok=True)
+    return sum(generate_file(country, list_file_info, scale, os.path.join(directory, get_file_name(url)), seed)
+               for seed, (url, list_file_info) in enumerate(get_files(country).items()))
+
+
+class QuietHandler(http.server.SimpleHTTPRequestHandler):
+    def do_GET(self):
+        # the paths asked for are kept (e.g. to check that each file is downloaded once, see serve).
+        self.server.list_paths.append(self.path)
+        super().do_GET()
+
+    def send_head(self):
+        path = self.translate_path(self.path)
+        range_header = self.headers.get('Range', '')
+        if not self.server.use_range or not range_header.startswith('bytes=') or not os.path.isfile(path) or \
+                not range_header[len('bytes='):].endswith('-'):
+            return super().send_head()
+
+        # not modified : the status 304 comes first.
+        since = self.headers.get('If-Modified-Since')
+        stat = os.stat(path)
+        if since is not None and int(stat.st_mtime) <= email.utils.parsedate_to_datetime(since).timestamp():
+            return super().send_head()
+
+        # only the end of the file, from the offset asked for (bytes=offset-).
+        offset = int(range_header[len('bytes='):-1])
+        if offset >= stat.st_size:
+            self.send_error(http.HTTPStatus.REQUESTED_RANGE_NOT_SATISFIABLE)
+            return None
+        source = open(path, 'rb')
+        source.seek(offset)
+        self.send_response(http.HTTPStatus.PARTIAL_CONTENT)
+        self.send_header('Content-type', self.guess_type(path))
+        self.send_header('Content-Range', 'bytes ' + str(offset) + '-' + str(stat.st_size - 1) + '/' +
+                         str(stat.st_size))
+        self.send_header('Content-Length', str(stat.st_size - offset))
+        self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+        self.end_headers()
+        return source
+
+    def send_response(self, code, message=None):
+        self.server.list_status.append(int(code))
+        super().send_response(code, message)
+
+    def copyfile(self, source, outputfile):
+        # the connection is lost after half of the content (see serve).
+        if self.server.truncate:
+            outputfile.write(source.read(os.fstat(source.fileno()).st_size // 2))
+            return
+        super().copyfile(source, outputfile)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(directory: str) -> Tuple[http.server.ThreadingHTTPServer, str]:
+    """
+    Serve the files of the directory on a local port (in a thread), as the real servers.
+    The server can be changed while it runs : server.use_range (answer the Range requests for the end of a file,
+    as some real servers) and server.truncate (the connection is lost after half of each file).
+    :return: the server (to shut it down, server.list_paths and server.list_status : the paths asked for and the
+    status of each response) and its url.
+    """
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), functools.partial(QuietHandler, directory=directory))
+    server.list_paths = list()
+    server.list_status = list()
+    server.use_range = False
+    server.truncate = False
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, 'http://127.0.0.1:' + str(server.server_address[1]) + '/'
+
+
+def get_local_info(country: Country, base_url: str) -> List[FileInformation]:
+    """
+    :return: the FileInformation of the country pointing to the local server (see serve).
+    """
+    list_file_info = DataSource.get_info_for_country(country)
+    for item in list_file_info:
+        item.http_file = base_url + get_file_name(item.http_file)
+    return list_file_info
@@ -0,0 +1,7 @@
+import os
+import sys
+
+# the modules of the repository, and the synthetic files served locally (see benchmarks/synthetic.py).
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'benchmarks'))
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from AxesPlotter import PlottedSeries
+
+
+def get_series(y: np.ndarray) -> PlottedSeries:
+    return PlottedSeries(pd.date_range('2020-03-01', periods=len(y), name='date'), y, False)
+
+
+def test_decimated_keeps_the_extremes():
+    y = np.random.default_rng(0).poisson(20, 3000).astype(float)
+    series = get_series(y)
+    x, y_decimated, n_visible = series.get_decimated(False, None, 100)
+    assert n_visible == 3000 and len(x) <= 4 * 100
+    assert y_decimated.min() == y.min() and y_decimated.max() == y.max()
+
+
+def test_decimated_without_values():
+    # the visible days are all NaN.
+    y = np.full(3000, np.nan)
+    y[:100] = 1.
+    series = get_series(y)
+    x_range = (series.x_num[2000], series.x_num[2900])
+    x, y_decimated, n_visible = series.get_decimated(False, x_range, 100)
+    assert len(x) == 0 and len(y_decimated) == 0 and n_visible == 903
+
+    # only one value : the visible range is one point.
+    y[1:] = np.nan
+    x, y_decimated, _ = get_series(y).get_decimated(False, None, 100)
+    np.testing.assert_array_equal(y_decimated, [1.])
@@ -0,0 +1,151 @@
+import collections
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+import urllib3
+
+import synthetic
+from DataAccessObject import DataAccessObject
+from Enums import Country, PatientCase, PatientCategory
+
+
+@pytest.fixture(scope='module')
+def served(tmp_path_factory):
+    """
+    The synthetic files of Belgium (20 days) served locally.
+    :return: the server, the FileInformation pointing to it and the directory of the files.
+    """
+    directory = str(tmp_path_factory.mktemp('files'))
+    synthetic.generate_country(Country.belgium, 0.1, directory)
+    server, base_url = synthetic.serve(directory)
+    yield server, synthetic.get_local_info(Country.belgium, base_url), directory
+    server.shutdown()
+
+
+def get_dao(served) -> DataAccessObject:
+    return DataAccessObject(Country.belgium, served[1], use_cache=False)
+
+
+def read_file(served, case: PatientCase, names: list) -> pd.DataFrame:
+    """
+    :return: the first file of the case with the categories, read as it is (universal headers).
+    """
+    for item in served[1]:
+        if item.case == case and all(PatientCategory[name] in item.dic_category for name in names):
+            table = pd.read_csv(os.path.join(served[2], synthetic.get_file_name(item.http_file)),
+                                sep=Country.belgium.sep, encoding=Country.belgium.encoding, na_values=item.na_values)
+            table = table[list(item.dic_category.values())]
+            table.columns = [category.name for category in item.dic_category.keys()]
+            table[PatientCategory.date.name] = pd.to_datetime(table[PatientCategory.date.name])
+            return table
+    raise KeyError(case)
+
+
+def get_expected(table: pd.DataFrame, names: list) -> pd.DataFrame:
+    """
+    :return: the total by date and by values of the categories, by a plain groupby.
+    """
+    if not names:
+        return table.groupby(PatientCategory.date.name)[PatientCategory.total.name].sum().to_frame('None')
+    return table.groupby([PatientCategory.date.name] + names)[PatientCategory.total.name].sum().unstack(names)
+
+
+def assert_same_totals(result: pd.DataFrame, expected: pd.DataFrame):
+    assert result.size > 0
+    assert result.index.equals(pd.DatetimeIndex(expected.index))
+    expected = expected.reindex(columns=result.columns)
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(float), equal_nan=True)
+
+
+def test_each_file_requested_once(served):
+    del served[0].list_paths[:]
+    dao = get_dao(served)
+    assert len(served[0].list_paths) == 0
+
+    dao.load()
+    dao.load()
+    dic_requests = collections.Counter(path.rsplit('/', 1)[1] for path in served[0].list_paths)
+
+    # one file for the 3 cases of the hospitalizations.
+    assert dic_requests == {'COVID19BE_CASES_AGESEX.csv': 1, 'COVID19BE_CASES_MUNI.csv': 1, 'COVID19BE_HOSP.csv': 1,
+                            'COVID19BE_MORT.csv': 1}
+
+
+def test_only_the_files_of_the_case_are_requested(served):
+    del served[0].list_paths[:]
+    dao = get_dao(served)
+    dao.get_data(PatientCase.death_daily, PatientCategory.age)
+    assert [path.rsplit('/', 1)[1] for path in served[0].list_paths] == ['COVID19BE_MORT.csv']
+    assert not dao.is_loaded(PatientCase.positive_to_covid_daily)
+
+
+def test_get_data_matches_groupby(served):
+    dao = get_dao(served)
+    for case in dict.fromkeys(item.case for item in served[1]):
+        for category in [PatientCategory.country] + dao.get_categories_available_for_case(case):
+            names = [] if category == PatientCategory.country else [category.name]
+            expected = get_expected(read_file(served, case, names), names)
+            assert_same_totals(dao.get_aggregate(case, category), expected)
+
+            # one DataFrame per value of the category.
+            dic_data = dao.get_data(case, category)
+            assert list(dic_data.keys()) == dao.get_aggregate(case, category).columns.tolist()
+
+
+def test_query_matches_groupby(served):
+    dao = get_dao(served)
+    table = read_file(served, PatientCase.death_daily, ['age', 'sex'])
+    expected = get_expected(table[table['geo_level_1'] == 'Wallonia'], ['age', 'sex'])
+
+    result = dao.query(PatientCase.death_daily, by=[PatientCategory.age, PatientCategory.sex],
+                       where={PatientCategory.geo_level_1: 'Wallonia'})
+    assert_same_totals(result, expected)
+
+    # the same query from the rollup already computed, on some dates.
+    result = dao.query(PatientCase.death_daily, by=[PatientCategory.sex], dates=('2020-03-05', '2020-03-10'))
+    expected = get_expected(table, ['sex']).loc['2020-03-05':'2020-03-10']
+    assert_same_totals(result, expected)
+
+    with pytest.raises(ValueError):
+        dao.query(PatientCase.death_daily, by=[PatientCategory.date])
+
+
+def test_derived_cases(served):
+    dao = get_dao(served)
+    assert PatientCase.death_cumsum in dao.get_cases_available()
+    assert PatientCase.hospitalization_daily_incidence not in dao.get_cases_available()
+
+    daily = dao.get_aggregate(PatientCase.death_daily, PatientCategory.sex)
+    cumsum = dao.get_aggregate(PatientCase.death_cumsum, PatientCategory.sex)
+    np.testing.assert_allclose(cumsum.to_numpy(), daily.cumsum().to_numpy(), equal_nan=True)
+    assert dao.get_derived_case(PatientCase.death_daily, 'cumsum') == PatientCase.death_cumsum
+
+    result = dao.query(PatientCase.death_cumsum, by=[PatientCategory.age, PatientCategory.sex])
+    expected = dao.query(PatientCase.death_daily, by=[PatientCategory.age, PatientCategory.sex]).cumsum()
+    np.testing.assert_allclose(result.to_numpy(), expected.to_numpy(), equal_nan=True)
+
+
+def test_connection_lost_while_reading(tmp_path):
+    # its own files : their date is changed.
+    synthetic.generate_country(Country.belgium, 0.1, str(tmp_path))
+    server, base_url = synthetic.serve(str(tmp_path))
+    try:
+        list_file_info = synthetic.get_local_info(Country.belgium, base_url)
+        dao = DataAccessObject(Country.belgium, list_file_info, use_cache=False)
+        expected = dao.get_aggregate(PatientCase.positive_to_covid_daily, PatientCategory.geo_level_1)
+
+        # the files changed, but only the beginning of each one is sent : the data loaded are kept.
+        server.truncate = True
+        for path in tmp_path.iterdir():
+            os.utime(str(path), (path.stat().st_mtime + 60,) * 2)
+        assert dao.refresh() == dict()
+        pd.testing.assert_frame_equal(dao.get_aggregate(PatientCase.positive_to_covid_daily,
+                                                        PatientCategory.geo_level_1), expected)
+
+        # nothing to fall back on.
+        with pytest.raises(urllib3.exceptions.HTTPError):
+            DataAccessObject(Country.belgium, list_file_info, use_cache=False).load()
+    finally:
+        server.shutdown()
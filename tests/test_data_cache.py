@@ -0,0 +1,62 @@
+import multiprocessing
+
+import numpy as np
+import pandas as pd
+
+from DataCache import DataCache
+
+url = 'http://127.0.0.1/CASES.csv'
+
+
+def get_table() -> pd.DataFrame:
+    return pd.DataFrame({'date': np.arange(1000, dtype=np.int32),
+                         'region': pd.Categorical(np.array(['Brussels', 'Flanders', 'Wallonia'])[np.arange(1000) % 3]),
+                         'total': pd.array(np.arange(1000), dtype='Int32')})
+
+
+def load_many(directory: str, n_loads: int) -> int:
+    """
+    :return: the number of loads which did not find the entry.
+    """
+    cache = DataCache(directory, ttl=float('inf'))
+    misses = 0
+    for index in range(n_loads):
+        entry = cache.load(url)
+        if entry is None:
+            misses += 1
+        elif index % 10 == 0:
+            cache.touch(entry)
+    return misses
+
+
+def test_store_load(tmp_path):
+    cache = DataCache(str(tmp_path))
+    table = get_table()
+    table.loc[3, 'total'] = pd.NA
+    cache.store(url, table, etag='"1"')
+
+    entry = cache.load(url)
+    assert entry.meta['etag'] == '"1"'
+    pd.testing.assert_frame_equal(entry.table.copy(), table, check_categorical=False)
+
+
+def test_load_in_several_processes(tmp_path):
+    # the processes load the same entry (and mark it fresh) at the same time : none of them may miss it.
+    DataCache(str(tmp_path)).store(url, get_table())
+    with multiprocessing.get_context('spawn').Pool(8) as pool:
+        misses = pool.starmap(load_many, [(str(tmp_path), 300)] * 8)
+    assert sum(misses) == 0
+    assert DataCache(str(tmp_path)).load(url) is not None
+
+
+def test_evict_least_recently_used(tmp_path):
+    cache = DataCache(str(tmp_path))
+    for name in ('.old', '', '.new'):
+        cache.store(url + name, get_table())
+    cache.max_size = sum(file.stat().st_size for file in tmp_path.rglob('*') if file.is_file()) * 3 // 4
+
+    # the oldest entry is used again : the second one is removed.
+    cache.load(url + '.old')
+    cache.evict()
+    assert cache.load(url) is None
+    assert cache.load(url + '.old') is not None and cache.load(url + '.new') is not None
@@ -0,0 +1,144 @@
+import datetime
+import os
+
+import pandas as pd
+import pytest
+
+import synthetic
+from DataAccessObject import DataAccessObject
+from Enums import Country, PatientCase, PatientCategory
+
+country = Country.belgium
+
+# the rollups computed before the refresh (see check_same_as_new).
+list_queries = [(PatientCase.death_daily, [PatientCategory.age, PatientCategory.sex]),
+                (PatientCase.positive_to_covid_daily, [PatientCategory.geo_level_2])]
+
+
+@pytest.fixture
+def served(tmp_path):
+    """
+    The synthetic files of Belgium (20 days) served locally, changed by each test.
+    :return: the server, the FileInformation pointing to it and the directory of the files.
+    """
+    synthetic.generate_country(country, 0.1, str(tmp_path))
+    server, base_url = synthetic.serve(str(tmp_path))
+    yield server, synthetic.get_local_info(country, base_url), tmp_path
+    server.shutdown()
+
+
+def get_loaded_dao(served) -> DataAccessObject:
+    """
+    :return: a data access object with all the aggregates and the rollups of list_queries computed.
+    """
+    dao = DataAccessObject(country, served[1], use_cache=False)
+    for case in dao.get_cases_available():
+        for category in [PatientCategory.country] + dao.get_categories_available_for_case(case):
+            dao.get_aggregate(case, category)
+    for case, by in list_queries:
+        dao.query(case, by=by)
+    return dao
+
+
+def change_files(served, function):
+    """
+    Change the lines of each file (function : name of the file, list of lines -> new list of lines), the files are
+    then newer.
+    """
+    for path in served[2].iterdir():
+        lines = path.read_bytes().decode(country.encoding).splitlines(True)
+        path.write_bytes(''.join(function(path.name, lines)).encode(country.encoding))
+        os.utime(str(path), (path.stat().st_mtime + 60,) * 2)
+    del served[0].list_status[:]
+
+
+def add_day(lines):
+    """
+    :return: the lines with one more day (the same rows as the last day).
+    """
+    last_date = lines[-1].split(country.sep, 1)[0]
+    new_date = (datetime.datetime.strptime(last_date, country.date_format) + datetime.timedelta(days=1)).strftime(
+            country.date_format)
+    return lines + [new_date + line[len(last_date):] for line in lines if line.startswith(last_date + country.sep)]
+
+
+def check_same_as_new(dao: DataAccessObject, served):
+    """
+    The aggregates and the rollups of the refreshed object are the same as the ones of a new object.
+    """
+    new_dao = DataAccessObject(country, served[1], use_cache=False)
+    for (case, category), aggregate in dao.dic_aggregate.items():
+        pd.testing.assert_frame_equal(aggregate, new_dao.get_aggregate(case, category), check_freq=False)
+    for case, by in list_queries:
+        pd.testing.assert_frame_equal(dao.query(case, by=by), new_dao.query(case, by=by), check_freq=False)
+
+
+def test_refresh_end_of_the_files(served):
+    served[0].use_range = True
+    dao = get_loaded_dao(served)
+    last_date = dao.get_aggregate(PatientCase.death_daily, PatientCategory.country).index[-1]
+
+    change_files(served, lambda name, lines: add_day(lines))
+    dic_since = dao.refresh()
+
+    # only the end of each file is sent, and parsed.
+    assert served[0].list_status == [206] * 4
+    assert set(dic_since.keys()) >= {PatientCase.death_daily, PatientCase.positive_to_covid_daily}
+    # from the last row before the last refresh_days days.
+    assert all(since is not None and last_date - pd.Timedelta(days=dao.refresh_days + 1) <= since <= last_date
+               for since in dic_since.values())
+    assert dao.get_aggregate(PatientCase.death_daily, PatientCategory.country).index[-1] == \
+        last_date + pd.Timedelta(days=1)
+    check_same_as_new(dao, served)
+
+
+def test_refresh_without_range(served):
+    # the server sends the whole file : the beginning is skipped.
+    dao = get_loaded_dao(served)
+    change_files(served, lambda name, lines: add_day(lines))
+    dic_since = dao.refresh()
+
+    assert served[0].list_status == [200] * 4
+    assert all(since is not None for since in dic_since.values())
+    check_same_as_new(dao, served)
+
+
+def test_refresh_shorter_file(served):
+    # the end of the file asked for does not exist any more : the whole file is parsed.
+    served[0].use_range = True
+    dao = get_loaded_dao(served)
+    change_files(served, lambda name, lines: lines[:len(lines) // 4])
+    dic_since = dao.refresh()
+
+    assert sorted(served[0].list_status) == [200] * 4 + [416] * 4
+    assert all(since is None for since in dic_since.values())
+    check_same_as_new(dao, served)
+
+
+def test_refresh_changed_beginning(served):
+    # the first row of the end of each file (see DataAccessObject._get_tail) changed : the whole file is parsed.
+    served[0].use_range = True
+    dao = get_loaded_dao(served)
+    dic_row = {synthetic.get_file_name(url): entry.meta['tail']['row'] for url, entry in dao.dic_entry.items()}
+
+    def change_row(name, lines):
+        # the last total of the row (the header is the first line).
+        line = lines[dic_row[name] + 1]
+        lines[dic_row[name] + 1] = line[:line.rindex(country.sep) + 1] + '99999\n'
+        return lines
+
+    change_files(served, change_row)
+    dic_since = dao.refresh()
+
+    assert sorted(served[0].list_status) == [200] * 4 + [206] * 4
+    assert all(since is None for since in dic_since.values())
+    check_same_as_new(dao, served)
+    assert dao.get_aggregate(PatientCase.death_daily, PatientCategory.country).max()['None'] >= 99999
+
+
+def test_refresh_not_modified(served):
+    served[0].use_range = True
+    dao = get_loaded_dao(served)
+    del served[0].list_status[:]
+    assert dao.refresh() == dict()
+    assert served[0].list_status == [304] * 4
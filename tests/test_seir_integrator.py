@@ -0,0 +1,79 @@
+import numpy as np
+import pandas as pd
+import pytest
+from scipy.integrate import solve_ivp
+
+from Enums import Country
+from SEIRIntegrator import SEIRIntegrator
+from SEIR_model import SEIRModel
+
+sigma, gamma, N = 1 / 5.2, 1 / 18, 11.4e6
+y_0 = [N - 8000., 7000., 1000., 0.]
+
+# piecewise constant Re : one value per day.
+Re = np.repeat([2.6, 1.5, 0.8, 1.1], 10)
+
+
+def get_reference(Re_days: np.ndarray) -> np.ndarray:
+    """
+    :return: the states at the beginning of each day, solve_ivp being restarted each day (Re is constant).
+    """
+    def dydt(t, y, Re_day):
+        S, E, I, R = y
+        infection = Re_day * gamma * I * S / N
+        return [-infection, infection - sigma * E, sigma * E - gamma * I, gamma * I]
+
+    list_states = [np.array(y_0)]
+    for Re_day in Re_days:
+        list_states.append(solve_ivp(dydt, [0, 1], list_states[-1], args=(Re_day,), rtol=1e-10, atol=1e-6).y[:, -1])
+    return np.array(list_states)
+
+
+def get_hospitalization(n_days: int = 40) -> pd.DataFrame:
+    return pd.DataFrame({'total': 20 * np.exp(0.08 * np.arange(n_days))},
+                        index=pd.date_range('2020-03-01', periods=n_days, name='date'))
+
+
+def test_integrate_matches_solve_ivp():
+    states = SEIRIntegrator(sigma, gamma, N).integrate(y_0, Re)
+    np.testing.assert_allclose(states, get_reference(Re), rtol=1e-5, atol=1e-3)
+
+
+def test_integrate_several_trajectories():
+    # one trajectory per value of Re for the first day : same as one integration per value.
+    integrator = SEIRIntegrator(sigma, gamma, N)
+    candidates = np.array([0.5, 1.2, 2.6])
+    states = integrator.integrate(y_0, [candidates] + Re[1:].tolist())
+    for index, candidate in enumerate(candidates):
+        np.testing.assert_allclose(states[..., index], integrator.integrate(y_0, [candidate] + Re[1:].tolist()),
+                                   rtol=1e-12)
+
+
+def test_integrate_sensitivity_matches_finite_differences():
+    integrator = SEIRIntegrator(sigma, gamma, N)
+    states, d_state, d_Re = integrator.integrate_sensitivity(y_0, Re[:5])
+    np.testing.assert_allclose(states, integrator.integrate(y_0, Re[:5]), rtol=1e-12)
+
+    # derivatives of the state at the end of the first day.
+    step = 1e-5
+    d_Re_numeric = (integrator.integrate(y_0, [Re[0] + step])[1] - integrator.integrate(y_0, [Re[0] - step])[1]) / \
+        (2 * step)
+    np.testing.assert_allclose(d_Re[0], d_Re_numeric, rtol=1e-5, atol=1e-3)
+
+    for index in range(4):
+        step = 1e-3 * max(abs(y_0[index]), 1.)
+        y_plus, y_minus = np.array(y_0), np.array(y_0)
+        y_plus[index] += step
+        y_minus[index] -= step
+        d_state_numeric = (integrator.integrate(y_plus, Re[:1])[1] - integrator.integrate(y_minus, Re[:1])[1]) / \
+            (2 * step)
+        np.testing.assert_allclose(d_state[0][:, index], d_state_numeric, rtol=1e-5, atol=1e-8)
+
+
+@pytest.mark.parametrize('R0', [0.5, 1.2, 2.6])
+def test_cost_function_engines_agree(R0):
+    # the 'scipy' engine uses solve_ivp with its default tolerance (rtol = 1e-3) : the costs agree within 3%.
+    hospitalization = get_hospitalization()
+    costs = [SEIRModel(Country.belgium, 2.6, 1, engine=engine, hospitalization=hospitalization)._cost_function(R0, 10)
+             for engine in SEIRModel.engines]
+    assert costs[0] == pytest.approx(costs[1], rel=0.03)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Enums import Country, PatientCategory
+from Population import get_population
+from Transform import DoublingTime, GrowthRate, PerCapita, Pipeline, RollingMean, RollingSum, Scale, Threshold
+
+dates = pd.date_range('2020-03-01', periods=60, name='date')
+
+
+def get_aggregate(n_series: int = 5) -> pd.DataFrame:
+    values = np.random.default_rng(0).poisson(20, (len(dates), n_series)).astype(float)
+    values[values < 14] = np.nan
+    return pd.DataFrame(values, index=dates, columns=['M' + str(index) for index in range(n_series)])
+
+
+def test_rolling_matches_pandas():
+    aggregate = get_aggregate()
+    pd.testing.assert_frame_equal(Pipeline(RollingMean(7)).apply(aggregate, Country.belgium),
+                                  aggregate.rolling(7, min_periods=1).mean())
+    pd.testing.assert_frame_equal(Pipeline(RollingSum(14, 3)).apply(aggregate, Country.belgium),
+                                  aggregate.rolling(14, min_periods=3).sum())
+
+
+def test_reference_curve_of_the_model():
+    # same as the steps of SEIRModel before the pipeline.
+    hospitalization = pd.DataFrame({'total': np.r_[np.arange(15), np.linspace(20, 3000, 45)]}, index=dates)
+    expected = hospitalization[hospitalization['total'] > 10] / 0.0046
+    expected = expected.rolling(7, min_periods=1).mean()
+
+    result = Pipeline(Threshold(10), Scale(1 / 0.0046), RollingMean(7)).apply(hospitalization, Country.belgium)
+    pd.testing.assert_frame_equal(result, expected, rtol=1e-12)
+
+
+def test_growth_rate_and_doubling_time():
+    aggregate = pd.DataFrame({'None': 100 * 2 ** (np.arange(len(dates)) / 5)}, index=dates)
+    growth_rate = Pipeline(GrowthRate(7)).apply(aggregate, Country.belgium)['None']
+    doubling_time = Pipeline(DoublingTime(7)).apply(aggregate, Country.belgium)['None']
+    assert growth_rate.iloc[:7].isna().all() and doubling_time.iloc[:7].isna().all()
+    np.testing.assert_allclose(growth_rate.iloc[7:], 2 ** (1 / 5) - 1)
+    np.testing.assert_allclose(doubling_time.iloc[7:], 5)
+
+
+def test_per_capita_country():
+    aggregate = pd.DataFrame({'None': np.full(len(dates), 1000.)}, index=dates)
+    result = Pipeline(PerCapita()).apply(aggregate, Country.belgium)
+    np.testing.assert_allclose(result['None'], 1000 * 100000 / get_population(Country.belgium))
+    assert Pipeline(PerCapita()).is_available(PatientCategory.country)
+
+
+def test_per_capita_needs_the_population_of_each_series():
+    # the population of the regions is not known : not divided by the population of the whole country.
+    aggregate = get_aggregate()
+    assert not Pipeline(PerCapita()).is_available(PatientCategory.geo_level_3)
+    with pytest.raises(ValueError):
+        Pipeline(RollingMean(7), PerCapita()).apply(aggregate, Country.belgium)
+
+    dic_population = {label: 1000. * (index + 1) for index, label in enumerate(aggregate.columns)}
+    result = Pipeline(PerCapita(dic_population=dic_population)).apply(aggregate, Country.belgium)
+    np.testing.assert_allclose(result.to_numpy(), aggregate.to_numpy() * 100000 / np.arange(1000, 6000, 1000))
+
+
+def test_pipeline_key():
+    assert Pipeline(RollingMean(7), PerCapita()) == Pipeline.parse([['rolling_mean', 7], 'per_capita'])
+    assert hash(Pipeline(RollingMean(7))) == hash(Pipeline().then(RollingMean(7)))
+    assert Pipeline(RollingMean(7)) != Pipeline(RollingMean(14))
+    with pytest.raises(ValueError):
+        Pipeline.parse(['unknown'])